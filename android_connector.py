@@ -1,6 +1,35 @@
 from ppadb.client import Client as AdbClient
 import os
+import re
+import struct
+import threading
+import time
+import uuid
+import numpy as np
+from io import BytesIO
+from typing import NamedTuple
 from PIL import Image
+from timing import span
+
+# Package of the focused window in `dumpsys window` output, e.g.
+# mCurrentFocus=Window{6c1d2f4 u0 co.hinge.app/co.hinge.app.MainActivity}
+FOCUS_PATTERN = re.compile(r"mCurrentFocus=Window\{\S+ \S+ ([\w.]+)/")
+FOCUSED_APP_PATTERN = re.compile(r"mFocusedApp=\S+\{\S+ \S+ ([\w.]+)/")
+# Component in resume and focus events of the logcat events buffer
+COMPONENT_PATTERN = re.compile(r"([A-Za-z]\w*(?:\.\w+)+)/[\w.$]+")
+FOCUS_EVENT_TAGS = "wm_set_resumed_activity am_set_resumed_activity input_focus"
+
+WM_SIZE_PATTERN = re.compile(r"(Physical|Override) size: (\d+)x(\d+)")
+WM_DENSITY_PATTERN = re.compile(r"(Physical|Override) density: (\d+)")
+
+# Android PixelFormat values for the 4 byte-per-pixel layouts screencap emits
+RAW_FORMAT_RGBA_8888 = 1
+RAW_FORMAT_RGBX_8888 = 2
+RAW_FORMAT_BGRA_8888 = 5
+
+# Pause between background captures. Each raw frame is ~10 MB over ADB, so
+# capturing back to back would compete with taps and shell commands.
+STREAM_INTERVAL = 0.2
 
 class AndroidDeviceConnector:
     def __init__(self, host="127.0.0.1", port=5037):
@@ -8,6 +37,15 @@ class AndroidDeviceConnector:
         self.device = None
         self.connected = False
         self.screenshot_count = 0
+        self.raw_capture = True
+        self.frame_stream = None
+        self.persistent_shell = True
+        self.shell_session = None
+        self.foreground_ttl = 2.0
+        self.foreground_watcher = None
+        self._foreground = None
+        self._foreground_time = 0.0
+        self._geometry = None
 
     def list_devices(self):
         """List all connected Android devices"""
@@ -31,6 +69,7 @@ class AndroidDeviceConnector:
                 self.device = devices[0]
             
             self.connected = True
+            self._geometry = None
             print(f"Connected to device: {self.device.serial}")
             return True
         except Exception as e:
@@ -59,18 +98,165 @@ class AndroidDeviceConnector:
             print(f"Error getting device info: {e}")
             return None
 
+    def display_geometry(self):
+        """Return the display size and density, queried once per connection"""
+        if self._geometry is not None:
+            return self._geometry
+
+        geometry = None
+        if self.connected:
+            geometry = parse_display_geometry(self.execute_command("wm size; wm density") or "")
+        if geometry is None:
+            print("Could not read display size, assuming 1080x2400")
+            geometry = DisplayGeometry(1080, 2400, 420)
+        if self.connected:
+            self._geometry = geometry
+        return geometry
+
+    @property
+    def screen_width(self):
+        return self.display_geometry().width
+
+    @property
+    def screen_height(self):
+        return self.display_geometry().height
+
+    def tap(self, x, y, frame_size=None):
+        """Tap a point given in device pixels, or in pixels of a captured frame
+        of `frame_size` (width, height) which is mapped onto the display"""
+        if frame_size:
+            x, y = self.display_geometry().to_device(x, y, *frame_size)
+        return self.execute_command(f"input tap {x} {y}")
+
+    def swipe(self, x1, y1, x2, y2, duration_ms=500, frame_size=None):
+        """Swipe between two points in device or frame pixels, see `tap`.
+        Slow swipes scroll by about their length without a fling."""
+        if frame_size:
+            x1, y1 = self.display_geometry().to_device(x1, y1, *frame_size)
+            x2, y2 = self.display_geometry().to_device(x2, y2, *frame_size)
+        return self.execute_command(f"input swipe {x1} {y1} {x2} {y2} {duration_ms}")
+
     def execute_command(self, command):
         """Execute a shell command on the device"""
         if not self.connected:
             print("No device connected")
             return None
 
+        if self.persistent_shell:
+            try:
+                return self._run_in_session([command])[0][0]
+            except ShellSessionError as e:
+                if e.sent:
+                    # The command may have run; running it again could repeat a tap or key press
+                    return None
+
         try:
             return self.device.shell(command)
         except Exception as e:
             print(f"Error executing command: {e}")
             return None
 
+    def execute_batch(self, commands):
+        """Run several shell commands in one round trip, over the persistent
+        shell session when it works. Returns a list of (output, exit_status)
+        pairs, or None if the commands could not be run."""
+        if not self.connected:
+            print("No device connected")
+            return None
+
+        if self.persistent_shell:
+            try:
+                return self._run_in_session(commands)
+            except ShellSessionError as e:
+                if e.sent:
+                    return None
+
+        # The same script over a one-off shell connection
+        try:
+            marker = batch_marker()
+            output = self.device.shell(batch_script(commands, marker))
+            results = parse_batch_output(output.encode("utf-8"), marker)
+            if len(results) != len(commands):
+                raise RuntimeError(f"{len(results)} of {len(commands)} commands reported an exit status")
+            return results
+        except Exception as e:
+            print(f"Error executing commands: {e}")
+            return None
+
+    def _run_in_session(self, commands):
+        """Run commands over the persistent session. On failure the session is
+        given up for the rest of the connection, as raw capture is, so a device
+        whose shell never answers costs one timeout rather than one per command."""
+        try:
+            if self.shell_session is None:
+                self.shell_session = ShellSession(self.device)
+                self.shell_session.open()
+            return self.shell_session.run_batch(commands)
+        except Exception as e:
+            print(f"Persistent shell session failed, falling back to one connection per call: {e}")
+            self.close_shell_session()
+            self.persistent_shell = False
+            if isinstance(e, ShellSessionError):
+                raise
+            raise ShellSessionError(str(e), sent=False) from e
+
+    def close_shell_session(self):
+        """Close the persistent shell session, if one is open"""
+        if self.shell_session:
+            self.shell_session.close()
+            self.shell_session = None
+
+    def foreground_package(self, max_age=None):
+        """Return the package of the focused window, or None if unknown.
+
+        Served from the focus watcher when it is running, otherwise from a
+        cached `dumpsys window` lookup no older than `max_age` seconds
+        (defaults to `foreground_ttl`).
+        """
+        if self.foreground_watcher and self.foreground_watcher.running and self.foreground_watcher.package:
+            return self.foreground_watcher.package
+
+        max_age = self.foreground_ttl if max_age is None else max_age
+        if self._foreground and time.monotonic() - self._foreground_time < max_age:
+            return self._foreground
+
+        package = self._query_foreground_package()
+        if package:
+            self._foreground = package
+            self._foreground_time = time.monotonic()
+        return package
+
+    def _query_foreground_package(self):
+        # The displays section is small and carries the focus on Android 10+,
+        # older releases report it in the windows section
+        for section in ("displays", "windows"):
+            output = self.execute_command(f"dumpsys window {section} | grep -E 'mCurrentFocus|mFocusedApp'")
+            if not output:
+                continue
+            match = FOCUS_PATTERN.search(output) or FOCUSED_APP_PATTERN.search(output)
+            if match:
+                return match.group(1)
+        return None
+
+    def start_foreground_watcher(self):
+        """Follow focus changes from logcat in a background thread"""
+        if not self.connected:
+            print("No device connected")
+            return False
+
+        if self.foreground_watcher and self.foreground_watcher.running:
+            return True
+
+        self.foreground_watcher = ForegroundWatcher(self.device, initial_package=self.foreground_package(max_age=0))
+        self.foreground_watcher.start()
+        return True
+
+    def stop_foreground_watcher(self):
+        """Stop the focus watcher, if one is running"""
+        if self.foreground_watcher:
+            self.foreground_watcher.stop()
+            self.foreground_watcher = None
+
     def take_screenshot(self):
         """Take a screenshot and return the image data."""
         if not self.connected:
@@ -85,6 +271,78 @@ class AndroidDeviceConnector:
             print(f"Error taking screenshot: {e}")
             return None
 
+    def take_raw_screenshot(self):
+        """Pull the raw framebuffer and return it as an (H, W, C) uint8 array.
+
+        Skips the on-device PNG encode of `take_screenshot`. The returned array
+        is a view over the bytes received from ADB, so no pixel copy is made.
+        Returns None if the capture fails or the pixel format is unsupported.
+        """
+        if not self.connected:
+            print("No device connected")
+            return None
+
+        try:
+            conn = self.device.create_connection()
+            with conn:
+                conn.send("shell:/system/bin/screencap")
+                result = conn.read_all()
+            return parse_raw_screencap(result)
+        except Exception as e:
+            print(f"Error taking raw screenshot: {e}")
+            return None
+
+    def capture_frame(self, newer_than=None):
+        """Capture the screen as a numpy array, preferring the raw framebuffer.
+
+        When a frame stream is running the newest buffered frame is returned;
+        pass `newer_than` (a time.monotonic() timestamp) to wait for a frame
+        captured after that moment. Otherwise falls back to a one-shot capture.
+        """
+        if self.frame_stream and self.frame_stream.running:
+            frame = self.frame_stream.latest(newer_than=newer_than)
+            if frame is not None:
+                return frame
+
+        return self.capture_one_shot()
+
+    def capture_one_shot(self):
+        """Capture a single frame, decoding the PNG from `take_screenshot` when
+        raw capture is disabled or unavailable on the device."""
+        if self.raw_capture:
+            with span("capture.screencap_raw"):
+                frame = self.take_raw_screenshot()
+            if frame is not None:
+                return frame
+            print("Raw capture unavailable, falling back to PNG screenshots")
+            self.raw_capture = False
+
+        with span("capture.screencap_png"):
+            screenshot_data = self.take_screenshot()
+        if not screenshot_data:
+            return None
+        with span("capture.png_decode"):
+            return np.asarray(Image.open(BytesIO(screenshot_data)))
+
+    def start_stream(self, interval=STREAM_INTERVAL):
+        """Start capturing frames continuously in a background thread"""
+        if not self.connected:
+            print("No device connected")
+            return False
+
+        if self.frame_stream and self.frame_stream.running:
+            return True
+
+        self.frame_stream = FrameStream(self, interval=interval)
+        self.frame_stream.start()
+        return True
+
+    def stop_stream(self):
+        """Stop the background frame stream, if one is running"""
+        if self.frame_stream:
+            self.frame_stream.stop()
+            self.frame_stream = None
+
     def push_file(self, local_path, remote_path):
         """Push a file to the device"""
         if not self.connected:
@@ -113,6 +371,299 @@ class AndroidDeviceConnector:
             print(f"Error pulling file: {e}")
             return False
 
+class DisplayGeometry(NamedTuple):
+    """Display size in pixels (natural orientation) and density in dpi"""
+    width: int
+    height: int
+    density: int
+
+    def to_device(self, x, y, frame_width, frame_height):
+        """Map a point in a captured frame to device pixels, clamped to the screen"""
+        width, height = self.width, self.height
+        # Frames follow the current rotation, wm size reports the natural one
+        if (frame_width > frame_height) != (width > height):
+            width, height = height, width
+        if (frame_width, frame_height) != (width, height):
+            x = x * width / frame_width
+            y = y * height / frame_height
+        return max(0, min(int(x), width - 1)), max(0, min(int(y), height - 1))
+
+
+def parse_display_geometry(output):
+    """Parse `wm size; wm density` output, preferring override values"""
+    sizes = {kind: (int(width), int(height)) for kind, width, height in WM_SIZE_PATTERN.findall(output)}
+    densities = {kind: int(density) for kind, density in WM_DENSITY_PATTERN.findall(output)}
+    size = sizes.get("Override") or sizes.get("Physical")
+    if size is None:
+        return None
+    density = densities.get("Override") or densities.get("Physical") or 160
+    return DisplayGeometry(size[0], size[1], density)
+
+class ShellSessionError(RuntimeError):
+    """A shell session failure; `sent` tells whether the commands were
+    already written to the device and may have run"""
+
+    def __init__(self, message, sent):
+        super().__init__(message)
+        self.sent = sent
+
+
+def batch_marker():
+    return f"__hingeswiper_{uuid.uuid4().hex}__"
+
+
+def batch_script(commands, marker):
+    """Shell script running `commands` in order, each followed by `marker` and its exit status"""
+    return "".join(
+        f"{{ {command}\n}} </dev/null 2>&1; printf '\\n{marker}:%d\\n' $?\n"
+        for command in commands
+    )
+
+
+def marker_pattern(marker):
+    return re.compile(rb"\n" + marker.encode() + rb":(\d+)\n")
+
+
+def parse_batch_output(data, marker):
+    """Split the output of `batch_script` into (output, exit_status) pairs"""
+    results = []
+    start = 0
+    for match in marker_pattern(marker).finditer(data):
+        results.append((data[start:match.start()].decode("utf-8", errors="replace"), int(match.group(1))))
+        start = match.end()
+    return results
+
+
+class ShellSession:
+    """A single long-lived `sh` process on the device fed through stdin.
+
+    Commands are written as one script per batch, each followed by a unique
+    marker carrying its exit status, so a batch costs one ADB round trip
+    instead of one connection per command.
+    """
+
+    def __init__(self, device, timeout=10.0):
+        self.device = device
+        self.timeout = timeout
+        self._conn = None
+        self._buffer = b""
+        self._lock = threading.Lock()
+
+    def open(self):
+        """Start the remote shell"""
+        self._conn = self.device.create_connection(timeout=self.timeout)
+        self._conn.send("shell:sh")
+        self._buffer = b""
+
+    def close(self):
+        """Stop the remote shell and close the connection"""
+        if self._conn:
+            try:
+                self._conn.write(b"exit\n")
+            except OSError:
+                pass
+            self._conn.close()
+            self._conn = None
+
+    def run(self, command):
+        """Run one command and return (output, exit_status)"""
+        return self.run_batch([command])[0]
+
+    def run_batch(self, commands):
+        """Run commands in order and return a list of (output, exit_status)"""
+        if self._conn is None:
+            raise ShellSessionError("Shell session is not open", sent=False)
+
+        marker = batch_marker()
+        script = batch_script(commands, marker)
+        pattern = marker_pattern(marker)
+
+        with self._lock:
+            # Once the write starts the commands may run, whatever happens next
+            try:
+                self._conn.write(script.encode("utf-8"))
+                results = []
+                while len(results) < len(commands):
+                    match = pattern.search(self._buffer)
+                    if match is None:
+                        data = self._conn.read(4096)
+                        if not data:
+                            raise RuntimeError("Shell session closed by device")
+                        self._buffer += data
+                        continue
+                    output = self._buffer[:match.start()].decode("utf-8", errors="replace")
+                    results.append((output, int(match.group(1))))
+                    self._buffer = self._buffer[match.end():]
+            except Exception as e:
+                raise ShellSessionError(str(e), sent=True) from e
+        return results
+
+class ForegroundWatcher:
+    """Tracks the foreground package by tailing focus events from logcat.
+
+    Reads the events buffer for resumed-activity and input focus entries, so
+    `package` is updated as soon as the device switches apps.
+    """
+
+    def __init__(self, device, initial_package=None):
+        self.device = device
+        self.package = initial_package
+        self.running = False
+        self._conn = None
+        self._thread = None
+
+    def start(self):
+        """Start tailing logcat"""
+        if self.running:
+            return
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name="foreground-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        """Stop tailing logcat"""
+        self.running = False
+        if self._conn:
+            self._conn.close()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+
+    def handle_line(self, line):
+        """Update `package` from one line of `logcat -v raw` events output"""
+        if "Focus leaving" in line or "Focus request" in line:
+            return
+        match = COMPONENT_PATTERN.search(line)
+        if match:
+            self.package = match.group(1)
+
+    def _run(self):
+        try:
+            self._conn = self.device.create_connection()
+            self._conn.send(f"shell:logcat -b events -v raw -T 1 -s {FOCUS_EVENT_TAGS}")
+            pending = b""
+            while self.running:
+                data = self._conn.read(4096)
+                if not data:
+                    break
+                *lines, pending = (pending + data).split(b"\n")
+                for line in lines:
+                    self.handle_line(line.decode("utf-8", errors="replace"))
+        except Exception as e:
+            if self.running:
+                print(f"Foreground watcher stopped: {e}")
+        finally:
+            self.running = False
+            if self._conn:
+                self._conn.close()
+                self._conn = None
+
+class FrameStream:
+    """Captures a frame from a connector every `interval` seconds and keeps only the newest.
+
+    The buffer holds a single frame, so readers never wait on a cold capture
+    and memory stays bounded no matter how slowly frames are consumed. After
+    `max_failures` consecutive failed captures the stream stops itself and
+    `capture_frame` falls back to one-shot captures.
+    """
+
+    def __init__(self, connector, interval=STREAM_INTERVAL, max_failures=5):
+        self.connector = connector
+        self.interval = interval
+        self.max_failures = max_failures
+        self.running = False
+        self.frame_count = 0
+        self._frame = None
+        self._frame_time = 0.0
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def start(self):
+        """Start the capture thread"""
+        if self.running:
+            return
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name="frame-stream", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        """Stop the capture thread and wake up any waiting readers"""
+        self.running = False
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+
+    def latest(self, newer_than=None, timeout=2.0):
+        """Return the newest frame, optionally waiting for one captured after
+        `newer_than`. Returns None if no suitable frame arrives in time."""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self.running:
+                if self._frame is not None and (newer_than is None or self._frame_time > newer_than):
+                    return self._frame
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+        return None
+
+    def _run(self):
+        failures = 0
+        while self.running:
+            started = time.monotonic()
+            frame = self.connector.capture_one_shot()
+            if frame is None:
+                failures += 1
+                if failures >= self.max_failures:
+                    print("Frame stream stopped after repeated capture failures")
+                    self.running = False
+                    with self._condition:
+                        self._condition.notify_all()
+                    return
+                time.sleep(0.1)
+                continue
+
+            failures = 0
+            with self._condition:
+                self._frame = frame
+                self._frame_time = started
+                self.frame_count += 1
+                self._condition.notify_all()
+
+            if self.interval:
+                # Woken early by stop
+                with self._condition:
+                    self._condition.wait_for(lambda: not self.running, self.interval)
+
+def parse_raw_screencap(data):
+    """Parse `screencap` raw output into an (H, W, C) uint8 array view.
+
+    The output starts with a little-endian header of width, height and pixel
+    format, followed on Android 9+ by a colorspace field. The header size is
+    inferred from the payload length. Returns None for unsupported formats.
+    """
+    if not data or len(data) < 12:
+        return None
+
+    width, height, pixel_format = struct.unpack_from("<III", data, 0)
+    frame_size = width * height * 4
+    header_size = len(data) - frame_size
+    if header_size not in (12, 16):
+        return None
+
+    pixels = np.frombuffer(data, dtype=np.uint8, count=frame_size, offset=header_size)
+    pixels = pixels.reshape(height, width, 4)
+
+    if pixel_format == RAW_FORMAT_RGBA_8888:
+        return pixels
+    if pixel_format == RAW_FORMAT_RGBX_8888:
+        return pixels[..., :3]
+    if pixel_format == RAW_FORMAT_BGRA_8888:
+        return pixels[..., 2::-1]
+    return None
+
 def main():
     connector = AndroidDeviceConnector()
     
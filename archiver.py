@@ -0,0 +1,99 @@
+import glob
+import os
+import queue
+import threading
+from collections import deque
+from PIL import Image
+
+
+class ScreenshotArchiver:
+    """Saves frames in a background thread, keeping only the most recent ones.
+
+    `submit` never blocks: when `queue_size` frames are already waiting the
+    new frame is dropped and counted. Only the newest `keep_last` files are
+    kept on disk, and with `failures_only` frames from successful attempts
+    are not written at all. Set `enabled` to False to skip archiving.
+    """
+
+    def __init__(self, directory: str = "data/archive", image_format: str = "JPEG", quality: int = 85,
+                 keep_last: int = 20, failures_only: bool = False, queue_size: int = 4):
+        self.directory = directory
+        self.image_format = image_format.upper()
+        self.quality = quality
+        self.keep_last = keep_last
+        self.failures_only = failures_only
+        self.enabled = True
+        self.written = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._files = deque()
+        self._counter = 0
+        self._thread = None
+
+    def start(self):
+        """Start the writer thread, picking up the files of earlier runs"""
+        if self._thread is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        existing = sorted(glob.glob(os.path.join(self.directory, "frame_*")))
+        self._files.extend(existing)
+        if existing:
+            self._counter = int(os.path.basename(existing[-1]).split("_")[1])
+        self._prune()
+        self._thread = threading.Thread(target=self._run, name="screenshot-archiver", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Write the frames still queued and stop the writer thread"""
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, frame, failed: bool = False) -> bool:
+        """Queue a frame for writing. Returns False if it was skipped or dropped."""
+        if not self.enabled or (self.failures_only and not failed):
+            return False
+        if self._thread is None:
+            self.start()
+        try:
+            self._queue.put_nowait((frame, failed))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _run(self):
+        extension = "jpg" if self.image_format == "JPEG" else self.image_format.lower()
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            frame, failed = item
+            self._counter += 1
+            path = os.path.join(self.directory, f"frame_{self._counter:06d}_{'failed' if failed else 'ok'}.{extension}")
+            try:
+                image = Image.fromarray(frame)
+                if self.image_format == "JPEG" and image.mode != "RGB":
+                    image = image.convert("RGB")
+                if self.image_format == "PNG":
+                    image.save(path, format=self.image_format)
+                else:
+                    image.save(path, format=self.image_format, quality=self.quality)
+            except Exception as e:
+                print(f"Error archiving screenshot: {e}")
+                continue
+            self.written += 1
+            self._files.append(path)
+            self._prune()
+
+    def _prune(self):
+        while len(self._files) > self.keep_last:
+            try:
+                os.remove(self._files.popleft())
+            except OSError:
+                pass
\ No newline at end of file
@@ -0,0 +1,135 @@
+from typing import List, NamedTuple, Optional
+import cv2
+import numpy as np
+from frame import as_frame
+from image_prep import CHAT_IMAGE_CONFIG, ImagePrepConfig
+
+# Conversation title bar, between the status bar and the transcript
+CHAT_HEADER_CROP = (0.0, 0.03, 1.0, 0.1)
+
+def _thumbnail(frame, crop, size) -> np.ndarray:
+    frame = as_frame(frame)
+    left, top, right, bottom = crop
+    gray = frame.gray[int(top * frame.height):int(bottom * frame.height), int(left * frame.width):int(right * frame.width)]
+    return frame.memo(("chat_thumbnail", crop, size),
+                      lambda: cv2.resize(gray, size, interpolation=cv2.INTER_AREA).astype(np.float32))
+
+
+def transcript_rows(frame, crop, step: int = 4, columns: int = 64) -> np.ndarray:
+    """Grayscale transcript downsampled to one row every `step` pixels, `columns` wide"""
+    frame = as_frame(frame)
+    height = int(crop[3] * frame.height) - int(crop[1] * frame.height)
+    return _thumbnail(frame, crop, (columns, max(1, height // step)))
+
+
+def new_rows_start(previous: np.ndarray, current: np.ndarray, tolerance: float = 6.0,
+                   min_overlap: int = 8) -> Optional[int]:
+    """Return the first row of `current` that was not on screen in `previous`.
+
+    New messages push the transcript up, so `previous` is tried shifted up
+    by every offset and the offset matching the most leading rows of
+    `current` wins; everything below the matching rows is new. Returns
+    len(current) when nothing changed and None when fewer than
+    `min_overlap` rows match, e.g. after switching conversations.
+    """
+    if previous is None or previous.shape != current.shape:
+        return None
+
+    height = len(current)
+    best = 0
+    for shift in range(height - min_overlap):
+        differences = np.abs(current[:height - shift] - previous[shift:]).mean(axis=1)
+        mismatched = np.flatnonzero(differences > tolerance)
+        matching = int(mismatched[0]) if mismatched.size else height - shift
+        if matching > best:
+            best = matching
+            if best == height:
+                break
+    return best if best >= min_overlap else None
+
+
+class Conversation:
+    """What the model has already seen of one conversation"""
+
+    def __init__(self, header: np.ndarray):
+        self.header = header
+        self.rows = None
+        self.summary = None
+        self.replies = None
+
+
+class ChatUpdate(NamedTuple):
+    """The part of a chat screenshot to send to the model.
+
+    `config` crops the frame to the new messages when `incremental`, to the
+    whole transcript otherwise. `unchanged` means nothing new is on screen.
+    """
+    conversation: Conversation
+    config: ImagePrepConfig
+    rows: np.ndarray
+    incremental: bool
+    unchanged: bool
+
+
+class ChatContext:
+    """Per-conversation state for analysing only what changed in a chat.
+
+    Conversations are told apart by a thumbnail of their title bar. For a
+    known conversation the transcript is compared row by row with the one
+    last analysed, and only the rows below the part still on screen are
+    sent, together with the model's rolling summary of the earlier turns.
+    The whole transcript is sent the first time, after a large change and
+    when no summary is available yet.
+    """
+
+    def __init__(self, config: ImagePrepConfig = CHAT_IMAGE_CONFIG, header_crop=CHAT_HEADER_CROP,
+                 header_tolerance: float = 3.0, max_new_fraction: float = 0.6, margin_rows: int = 6,
+                 max_conversations: int = 32):
+        self.config = config
+        self.header_crop = header_crop
+        self.header_tolerance = header_tolerance
+        self.max_new_fraction = max_new_fraction
+        self.margin_rows = margin_rows
+        self.max_conversations = max_conversations
+        self.step = 4
+        self._conversations = []
+
+    def conversation(self, frame) -> Conversation:
+        """Return the state of the conversation on screen, starting a new one if unknown"""
+        header = _thumbnail(frame, self.header_crop, (128, 16))
+        for index, conversation in enumerate(self._conversations):
+            if np.abs(conversation.header - header).mean() <= self.header_tolerance:
+                # Most recently used first
+                self._conversations.insert(0, self._conversations.pop(index))
+                return conversation
+
+        conversation = Conversation(header)
+        self._conversations.insert(0, conversation)
+        del self._conversations[self.max_conversations:]
+        return conversation
+
+    def plan(self, frame) -> ChatUpdate:
+        """Decide what of `frame` to send for the conversation on screen"""
+        frame = as_frame(frame)
+        conversation = self.conversation(frame)
+        rows = transcript_rows(frame, self.config.crop, self.step)
+        start = new_rows_start(conversation.rows, rows) if conversation.summary is not None else None
+
+        if start is None or (len(rows) - start) > self.max_new_fraction * len(rows):
+            return ChatUpdate(conversation, self.config, rows, incremental=False, unchanged=False)
+        if start == len(rows):
+            return ChatUpdate(conversation, self.config, rows, incremental=False, unchanged=True)
+
+        left, top, right, bottom = self.config.crop
+        start = max(0, start - self.margin_rows)
+        new_top = top + start * self.step / frame.height
+        return ChatUpdate(conversation, self.config._replace(crop=(left, new_top, right, bottom)), rows,
+                          incremental=True, unchanged=False)
+
+    def commit(self, update: ChatUpdate, replies: List[str], summary: Optional[str]):
+        """Record a successful analysis as the new baseline for its conversation"""
+        conversation = update.conversation
+        conversation.rows = update.rows
+        conversation.replies = replies
+        if summary:
+            conversation.summary = summary
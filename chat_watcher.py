@@ -0,0 +1,176 @@
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional
+import numpy as np
+from chat_context import new_rows_start, transcript_rows
+from frame import Frame
+
+# Fraction of the transcript width at each edge where only incoming
+# (left) or only outgoing (right) bubbles start
+BUBBLE_EDGE = 0.15
+
+
+def incoming_message(rows: np.ndarray, start: int, threshold: float = 12.0) -> bool:
+    """Whether the last bubble in the transcript rows from `start` down is incoming (left aligned)"""
+    content = np.abs(rows[start:] - np.median(rows)) > threshold
+    filled = np.flatnonzero(content.any(axis=1))
+    if not filled.size:
+        return False
+
+    # The bottom-most run of rows with content is the newest bubble
+    gaps = np.flatnonzero(np.diff(filled) > 1)
+    bubble = content[filled[gaps[-1] + 1] if gaps.size else filled[0]:filled[-1] + 1]
+    edge = max(1, int(rows.shape[1] * BUBBLE_EDGE))
+    return bubble[:, :edge].any(axis=1).mean() > bubble[:, -edge:].any(axis=1).mean()
+
+
+class _Job:
+    def __init__(self, rows: np.ndarray, future: Future, cancellable: bool):
+        self.rows = rows
+        self.future = future
+        self.cancellable = cancellable
+
+    @property
+    def failed(self) -> bool:
+        """Whether the job finished without replies: raised, was abandoned or returned none"""
+        if not self.future.done():
+            return False
+        return self.future.cancelled() or self.future.exception() is not None or not self.future.result()
+
+
+class ChatWatcher:
+    """Precomputes reply suggestions while the user reads the chat.
+
+    A background thread samples the chat every `interval` seconds, reusing
+    the frame stream when it runs, and reduces each frame to downsampled
+    transcript rows. Once the transcript has held still for
+    `settle_samples` samples, the first screen of a conversation or a new
+    incoming bubble starts a suggestion job on a worker thread. A job still
+    streaming when the transcript changes again is abandoned, and one that
+    failed or found no replies is never reused. All chat analysis goes
+    through the worker, so `suggestions` returns the ready result for the
+    screen on display, or waits for one.
+    """
+
+    def __init__(self, automator, interval: float = 0.5, settle_samples: int = 2, tolerance: float = 2.0):
+        self.automator = automator
+        self.interval = interval
+        self.settle_samples = settle_samples
+        self.tolerance = tolerance
+        self.speculated = 0
+        self.cancelled = 0
+        self.logger = logging.getLogger(__name__)
+        self._crop = automator.chat_image_config.crop
+        self._generation = 0
+        self._rows = None
+        self._frame = None
+        self._job = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-suggestions")
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start sampling the chat"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="chat-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        """Stop sampling and abandon any job still streaming"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+        with self._lock:
+            self._generation += 1
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def suggestions(self) -> Optional[List[str]]:
+        """Return suggestions for the chat on screen, computing them if no job covers it"""
+        pixels = self.automator.capture_frame()
+        if pixels is None:
+            return None
+        frame = Frame(pixels)
+        rows = transcript_rows(frame, self._crop)
+
+        with self._lock:
+            job = self._job
+            if job is None or not self._same(job.rows, rows) or job.failed:
+                self._generation += 1
+                self._rows, self._frame = rows, frame
+                job = self._submit(frame, rows, cancellable=False)
+            elif job.future.done():
+                self.logger.info("Using precomputed chat suggestions")
+
+        if job.cancellable:
+            # A speculative job can still fail or be abandoned after a change
+            # that has since been undone, e.g. a scroll back; ask again then
+            try:
+                replies = job.future.result()
+            except Exception as e:
+                self.logger.warning(f"Precomputed chat suggestions failed: {e}")
+                replies = None
+            if replies:
+                return replies
+            with self._lock:
+                job = self._submit(frame, rows, cancellable=False)
+        return job.future.result()
+
+    def _same(self, previous, rows) -> bool:
+        return previous is not None and previous.shape == rows.shape and np.abs(previous - rows).mean() <= self.tolerance
+
+    def _submit(self, frame: Frame, rows: np.ndarray, cancellable: bool) -> _Job:
+        # Called with the lock held
+        generation = self._generation if cancellable else None
+        self._job = _Job(rows, self._executor.submit(self._suggest, frame, generation), cancellable)
+        return self._job
+
+    def _suggest(self, frame: Frame, generation: Optional[int]) -> Optional[List[str]]:
+        replies = []
+        for reply in self.automator.stream_chat_replies(frame):
+            if generation is not None and generation != self._generation:
+                # The chat changed while streaming; closing the stream drops the request
+                self.cancelled += 1
+                self.logger.info("Abandoned stale chat suggestions")
+                return None
+            replies.append(reply)
+        return replies
+
+    def _run(self):
+        stable = 0
+        while not self._stop.wait(self.interval):
+            try:
+                pixels = self.automator.capture_frame()
+                if pixels is None:
+                    continue
+                frame = Frame(pixels)
+                rows = transcript_rows(frame, self._crop)
+            except Exception as e:
+                self.logger.error(f"Chat watcher capture failed: {e}")
+                continue
+
+            with self._lock:
+                if not self._same(self._rows, rows):
+                    # Something moved; a job for the old screen is stale
+                    self._generation += 1
+                    self._rows, self._frame = rows, frame
+                    stable = 0
+                    continue
+
+                stable += 1
+                job = self._job
+                if stable != self.settle_samples or (job is not None and self._same(job.rows, rows) and not job.failed):
+                    continue
+
+                if job is None or job.failed:
+                    speculate = True
+                else:
+                    start = new_rows_start(job.rows, rows)
+                    speculate = start is None or incoming_message(rows, start)
+                if speculate:
+                    self.speculated += 1
+                    self._submit(self._frame, rows, cancellable=True)
@@ -0,0 +1,84 @@
+import hashlib
+from functools import cached_property
+from typing import Callable, Hashable
+import cv2
+import numpy as np
+from PIL import Image
+
+
+def frame_signature(pixels: np.ndarray) -> bytes:
+    """Cheap fingerprint of a frame, taken from a sparse grid of pixels"""
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(repr(pixels.shape).encode())
+    digest.update(pixels[::16, ::16].tobytes())
+    return digest.digest()
+
+
+class Frame:
+    """One captured screenshot and the representations derived from it.
+
+    Wraps the capture buffer without copying it. The grayscale array, PIL
+    image and anything registered through `memo` (encoded payloads, hashes,
+    thumbnails) are computed on first use and then shared by every consumer
+    of the frame. Treat the pixels as read-only.
+    """
+
+    def __init__(self, pixels: np.ndarray):
+        self.pixels = pixels
+        self._memo = {}
+
+    @property
+    def width(self) -> int:
+        return self.pixels.shape[1]
+
+    @property
+    def height(self) -> int:
+        return self.pixels.shape[0]
+
+    @property
+    def size(self):
+        """(width, height), as PIL reports it"""
+        return self.pixels.shape[1], self.pixels.shape[0]
+
+    @cached_property
+    def rgb(self) -> np.ndarray:
+        """RGB view of the pixels; drops alpha without copying"""
+        if self.pixels.ndim == 3 and self.pixels.shape[2] == 4:
+            return self.pixels[..., :3]
+        return self.pixels
+
+    @cached_property
+    def gray(self) -> np.ndarray:
+        if self.pixels.ndim == 2:
+            return self.pixels
+        if self.pixels.shape[2] == 4:
+            return cv2.cvtColor(self.pixels, cv2.COLOR_RGBA2GRAY)
+        return cv2.cvtColor(self.pixels, cv2.COLOR_RGB2GRAY)
+
+    @cached_property
+    def image(self) -> Image.Image:
+        """PIL image sharing the pixel buffer when it is contiguous"""
+        pixels = self.pixels
+        if pixels.flags.c_contiguous and pixels.ndim == 3 and pixels.shape[2] in (3, 4):
+            mode = "RGBA" if pixels.shape[2] == 4 else "RGB"
+            return Image.frombuffer(mode, self.size, pixels, "raw", mode, 0, 1)
+        return Image.fromarray(pixels)
+
+    @cached_property
+    def signature(self) -> bytes:
+        return frame_signature(self.pixels)
+
+    def memo(self, key: Hashable, compute: Callable):
+        """Return the value cached under `key`, computing it on first use"""
+        try:
+            return self._memo[key]
+        except KeyError:
+            value = self._memo[key] = compute()
+            return value
+
+
+def as_frame(screenshot) -> Frame:
+    """Wrap a numpy array or PIL image in a Frame; Frames pass through"""
+    if isinstance(screenshot, Frame):
+        return screenshot
+    return Frame(np.asarray(screenshot))
\ No newline at end of file
@@ -1,30 +1,78 @@
 from android_connector import AndroidDeviceConnector
 import time
-from typing import Optional, Dict
+from typing import Optional, Dict, Union
 import logging
-import base64
-from openai import OpenAI
 import os
-from PIL import Image
-from shape_matcher import find_shape_coordinates
+from concurrent.futures import Future, ThreadPoolExecutor
+from ui_locator import UILocator
+from frame import Frame, as_frame
+from model_client import ModelClient
+from chat_context import ChatContext, ChatUpdate
+from model_outputs import CHAT_SCHEMA, COMMENT_SCHEMA, completed_replies, parse_chat_replies, parse_comment, response_format
+from image_prep import CHAT_IMAGE_CONFIG, PROFILE_IMAGE_CONFIG, ImagePrepConfig, perceptual_hash, prepare_image, prepare_tiles
+from profile_capture import ProfileCapture, find_overlap, row_signatures, stitch
+from response_cache import ResponseCache
+from archiver import ScreenshotArchiver
+from text_input import TextInjector
+from screen_classifier import LOADING, MATCH, PROFILE, PROMO, REPEAT, ScreenClassifier
+from timing import span, timed
 import numpy as np
-from io import BytesIO
 import re
 
 class HingeAutomator(AndroidDeviceConnector):
     HINGE_PACKAGE = "co.hinge.app"
+    VISION_MODEL = "gpt-4.1-mini"
+    # Answers are constrained to the schemas in model_outputs, so the prompts
+    # only say what to write, not how to format it
+    PROFILE_PROMPT = """Write a short, flirty opener for this Hinge profile, built on a quirky or funny detail
+    in the photos, prompts or bio. The reader is a woman in her mid-late 20s.
+    At most 20 characters. No punctuation except , . ?"""
+    # Added when a scrolled profile is sent in several tiles
+    PROFILE_TILES_NOTE = "The images are consecutive parts of one profile, from top to bottom."
+    CHAT_PROMPT = """Suggest 5 different replies to this Hinge chat. Each is relevant, flirty but not sexual,
+    funny, 1-2 sentences, and ends with a question. No punctuation except , . ?"""
+    CHAT_SUMMARY_INSTRUCTION = "Summarize the whole conversation so far in at most 60 words."
+    # Sent instead of the earlier messages when only the new ones are in the image
+    CHAT_UPDATE_PREFIX = """Conversation so far: {summary}
+    The image shows only the newest messages."""
+    # Room for the JSON around a 20 character comment
+    COMMENT_MAX_TOKENS = 40
     
     def __init__(self, host="127.0.0.1", port=5037, openai_api_key=None):
         super().__init__(host, port)
         self.logger = logging.getLogger(__name__)
-        self.screen_width = 1080
-        self.screen_height = 2400
-        # self._get_screen_dimensions()
+        self.ui_locator = UILocator()
+        self.profile_image_config = PROFILE_IMAGE_CONFIG
+        self.chat_image_config = CHAT_IMAGE_CONFIG
+        self.chat_context = ChatContext(self.chat_image_config)
+        self.response_cache = ResponseCache()
+        self.archiver = ScreenshotArchiver()
+        self.text_injector = TextInjector(self)
+        self.screen_classifier = ScreenClassifier(self.ui_locator)
+        self.last_screen_state = None
+        self.last_settled_frame = None
+        self.max_profile_retries = 2
+        self._repeat_count = 0
+        # Request the comment while the profile is liked, see like_and_comment
+        self.pipelined = False
+        self._pipeline_executor = None
+        # Screens to scroll into each profile before asking for a comment, see capture_full_profile
+        self.profile_scrolls = 0
+        self.scroll_fraction = 0.6
         
-        # Initialize OpenAI client
-        self.openai_client = OpenAI(api_key=openai_api_key or os.getenv("OPENAI_API_KEY"))
-        if not self.openai_client.api_key:
+        # The OpenAI client is created on first use, see ModelClient
+        api_key = openai_api_key or os.getenv("OPENAI_API_KEY")
+        if not api_key:
             self.logger.warning("OpenAI API key not provided. GPT-4 Vision features will not work.")
+        self.model_client = ModelClient(api_key=api_key)
+
+    @property
+    def openai_client(self):
+        return self.model_client.client
+
+    @openai_client.setter
+    def openai_client(self, client):
+        self.model_client.client = client
     
     def is_hinge_installed(self) -> bool:
         """Check if Hinge is installed on the device"""
@@ -46,61 +94,30 @@ class HingeAutomator(AndroidDeviceConnector):
         try:
             # Launch Hinge
             self.execute_command(f"monkey -p {self.HINGE_PACKAGE} 1")
-            time.sleep(5)  # Wait for app to launch
+            # Wait for the first profile, or at least for the app to settle on another screen
+            if self.wait_for_element("heart", timeout=5.0) is None:
+                self.wait_until_stable(timeout=3.0)
             return True
         except Exception as e:
             self.logger.error(f"Error launching Hinge: {e}")
             return False
     
+    @timed("analyze_screenshot")
     def analyze_screenshot(self, screenshot) -> Optional[Dict]:
         """Analyze screenshot using shape matching to find the heart button and OpenAI Vision to analyze profile"""
         try:
-            # Convert PIL Image to numpy array
-            screenshot_np = np.array(screenshot)
+            # Share grayscale, hash and encoded views with every step below
+            frame = as_frame(screenshot)
             
             # Find heart button using shape matching
-            heart_template_path = "data/crop_right.png"
-            center = find_shape_coordinates(heart_template_path, screenshot_np)
+            with span("match.heart"):
+                center = self.ui_locator.locate("heart", frame)
             
             if not center:
                 self.logger.warning("Heart button not found in screenshot")
                 return None
 
-            # Convert PIL Image to PNG bytes
-            img_byte_arr = BytesIO()
-            screenshot.save(img_byte_arr, format='PNG')
-            img_byte_arr = img_byte_arr.getvalue()
-            
-            # Use OpenAI Vision to analyze the profile
-            base64_image = base64.b64encode(img_byte_arr).decode('utf-8')
-
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4.1-mini",
-                max_tokens=8,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": """Analyze this Hinge profile and suggest a short, personalized, and flirty message that would be memorable 
-                                and out of the norm. Look for quirky or amusing details in their photos, prompts, and bio,
-                                Make sure the message is memorable and unique, the recipient would be women in their mid-late 20s
-                                Make sure you dont generate more than 20 characters. Do not use any punctuation other than ',', '.','?' """
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/png;base64,{base64_image}"
-                                }
-                            }
-                        ]
-                    }
-                ],
-            )
-
-            suggested_comment = response.choices[0].message.content.strip()
-            self.logger.info(f"Generated suggested comment: {suggested_comment}")
+            suggested_comment = self.suggest_comment(frame)
             
             return {
                 "heart_button": {
@@ -113,9 +130,150 @@ class HingeAutomator(AndroidDeviceConnector):
         except Exception as e:
             self.logger.error(f"Error analyzing screenshot: {e}")
             return None
-    
-    def click_heart_button(self, coordinates: Dict[str, int], screenshot_path: str = "current_profile.png") -> bool:
-        """Click the heart button at specified coordinates, scaling if needed"""
+
+    def suggest_comment(self, screenshot, config: Optional[ImagePrepConfig] = None) -> str:
+        """Return a comment for a profile, reusing the one for a screen the model has already seen"""
+        frame = as_frame(screenshot)
+        config = config or self.profile_image_config
+        with span("cache.lookup"):
+            cache_key = self.response_cache.make_key(
+                perceptual_hash(frame, config), self.PROFILE_PROMPT, self.VISION_MODEL
+            )
+            suggested_comment = self.response_cache.get(cache_key)
+        if suggested_comment is not None:
+            self.logger.info(f"Using cached suggested comment: {suggested_comment}")
+        else:
+            suggested_comment = self._generate_comment(frame, config)
+            self.response_cache.set(cache_key, suggested_comment)
+        return suggested_comment
+
+    def _request_comment(self, frame: Frame, config: Optional[ImagePrepConfig] = None):
+        """Start `suggest_comment` on a worker thread and return its future"""
+        if self._pipeline_executor is None:
+            self._pipeline_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="comment")
+        return self._pipeline_executor.submit(self.suggest_comment, frame, config)
+
+    @timed("model.profile")
+    def _generate_comment(self, screenshot: Frame, config: ImagePrepConfig) -> str:
+        """Ask the vision model for a comment on a profile screenshot"""
+        # Crop, downscale and encode the profile for the vision model; a
+        # stitched profile is split into tiles that all go in one request
+        with span("encode.profile"):
+            images = prepare_tiles(screenshot, config)
+        for image in images:
+            self.logger.info(f"Profile image: {image.width}x{image.height}, {image.num_bytes} bytes, ~{image.estimated_tokens} tokens")
+
+        prompt = self.PROFILE_PROMPT if len(images) == 1 else f"{self.PROFILE_PROMPT}\n{self.PROFILE_TILES_NOTE}"
+        response = self.model_client.complete(
+            model=self.VISION_MODEL,
+            max_tokens=self.COMMENT_MAX_TOKENS,
+            response_format=response_format("comment", COMMENT_SCHEMA),
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": prompt
+                        },
+                        *(
+                            {
+                                "type": "image_url",
+                                "image_url": {
+                                    "url": image.data_url,
+                                    "detail": image.detail
+                                }
+                            }
+                            for image in images
+                        )
+                    ]
+                }
+            ],
+        )
+
+        suggested_comment = parse_comment(response.choices[0].message.content)
+        self.logger.info(f"Generated suggested comment: {suggested_comment}")
+        return suggested_comment
+
+    @timed("capture_profile")
+    def capture_full_profile(self, frame: Frame) -> ProfileCapture:
+        """Scroll up to `profile_scrolls` screens into the profile and stitch what was seen.
+
+        Consecutive frames are aligned by `find_overlap`; scrolling stops at
+        the end of the profile. A scroll that cannot be aligned is undone.
+        """
+        crop = self.profile_image_config.crop
+        top, bottom = int(crop[1] * frame.height), int(crop[3] * frame.height)
+        x = frame.width // 2
+        distance = int((bottom - top) * self.scroll_fraction)
+        start_y = bottom - (bottom - top - distance) // 2
+
+        frames = [frame]
+        offsets = []
+        for _ in range(self.profile_scrolls):
+            self.swipe(x, start_y, x, start_y - distance, frame_size=frame.size)
+            self.wait_until_stable(timeout=1.5)
+            pixels = self.capture_frame()
+            if pixels is None:
+                break
+            current = Frame(pixels)
+            with span("stitch.overlap"):
+                offset = find_overlap(row_signatures(frames[-1], crop), row_signatures(current, crop))
+            if offset is None:
+                self.logger.warning("Scrolled frame does not overlap the previous one, undoing the scroll")
+                self.swipe(x, start_y - distance, x, start_y, frame_size=frame.size)
+                self.wait_until_stable(timeout=1.5)
+                break
+            if offset == 0:
+                break
+            frames.append(current)
+            offsets.append(offset)
+
+        with span("stitch"):
+            image = stitch(frames, offsets, crop)
+        self.logger.info(f"Stitched {len(frames)} frames into {image.width}x{image.height}")
+        return ProfileCapture(image, frames, offsets, crop)
+
+    @timed("scroll_back")
+    def scroll_back(self, capture: ProfileCapture):
+        """Scroll back to the first frame of a capture by its stitched offsets.
+
+        Returns the frame now on screen and the heart button position in it,
+        found by template or, failing that, moved from the first frame by
+        whatever distance is left over; the position is None if neither works.
+        """
+        first = capture.frames[0]
+        top, bottom = int(capture.crop[1] * first.height), int(capture.crop[3] * first.height)
+        x = first.width // 2
+        remaining = capture.scrolled
+        while remaining > 0:
+            distance = min(remaining, int((bottom - top) * self.scroll_fraction))
+            start_y = top + (bottom - top - distance) // 2
+            self.swipe(x, start_y, x, start_y + distance, frame_size=first.size)
+            remaining -= distance
+        self.wait_until_stable(timeout=1.5)
+
+        pixels = self.capture_frame()
+        if pixels is None:
+            return None, None
+        frame = Frame(pixels)
+        with span("match.heart"):
+            heart = self.ui_locator.locate("heart", frame)
+        if heart is None:
+            first_heart = self.ui_locator.locate("heart", first)
+            left_over = find_overlap(row_signatures(first, capture.crop), row_signatures(frame, capture.crop))
+            if first_heart is not None and left_over is not None and first_heart[1] - left_over >= top:
+                heart = (first_heart[0], first_heart[1] - left_over)
+        return frame, heart
+
+    @timed("click_heart_button")
+    def click_heart_button(self, coordinates: Dict[str, int], frame_size: Optional[tuple] = None,
+                           changed_from=None) -> bool:
+        """Click the heart button at coordinates in a frame of `frame_size` (width, height), scaled to the device.
+
+        `changed_from`, the frame the heart was found in, makes the wait for
+        the like animation start only once the screen has reacted to the tap.
+        """
         if not self.connected:
             return False
 
@@ -127,93 +285,308 @@ class HingeAutomator(AndroidDeviceConnector):
                 self.logger.error(f"Invalid coordinates for heart button: {coordinates}")
                 return False
 
-            if self.screen_width is None or self.screen_height is None:
-                self.logger.error(f"Device screen dimensions not set: width={self.screen_width}, height={self.screen_height}")
-                return False
-
-            # Get screenshot size
-            with Image.open(screenshot_path) as img:
-                screenshot_width, screenshot_height = img.size
-
-            self.logger.info(f"Device screen size: {self.screen_width}x{self.screen_height}")
-            self.logger.info(f"Screenshot size: {screenshot_width}x{screenshot_height}")
-            self.logger.info(f"Model coordinates: x={x}, y={y}")
-
-            # Scale coordinates if screenshot size != device screen size
-            if screenshot_width != self.screen_width or screenshot_height != self.screen_height:
-                x = int(x * self.screen_width / screenshot_width)
-                y = int(y * self.screen_height / screenshot_height)
-                # Ensure coordinates stay within screen bounds
-                x = max(0, min(x, self.screen_width - 1))
-                y = max(0, min(y, self.screen_height - 1))
-                self.logger.info(f"Scaled coordinates: x={x}, y={y}")
-
-            # Execute the tap command
-            tap_command = f"input tap {x} {y}"
-            self.logger.info(f"Executing tap command: {tap_command}")
-            result = self.execute_command(tap_command)
+            result = self.tap(x, y, frame_size)
             self.logger.info(f"Tap command result: {result}")
             
-            time.sleep(2)  # Wait for the like animation
+            self.wait_until_stable(timeout=2.0, changed_from=changed_from)  # Wait for the like animation
             return True
         except Exception as e:
             self.logger.error(f"Error clicking heart button: {e}")
             return False
     
-    def post_comment(self, comment: str) -> bool:
-        """Post a comment after liking"""
+    def _stability_thumbnail(self, frame: np.ndarray) -> np.ndarray:
+        """Strided sample of a frame, about 128 pixels on the long edge"""
+        step = max(1, max(frame.shape[:2]) // 128)
+        return frame[::step, ::step, :3].astype(np.int16)
+
+    def _anchor_band(self, frame: np.ndarray, name: str, half_height: float = 0.03) -> np.ndarray:
+        """Thumbnail of the horizontal band around a fixed-position anchor"""
+        height, width = frame.shape[:2]
+        _, y = self.ui_locator.position_at(name, width, height)
+        band = int(half_height * height)
+        return self._stability_thumbnail(frame[max(0, y - band):y + band])
+
+    @timed("settle")
+    def wait_until_stable(self, timeout: float = 3.0, threshold: float = 1.0, stable_frames: int = 2,
+                          min_wait: float = 0.0, poll_interval: float = 0.05, changed_from=None) -> bool:
+        """Wait until consecutive frames stop changing.
+
+        Returns True once `stable_frames` frame-to-frame differences in a row
+        fall below `threshold` (mean absolute difference per channel), or
+        False when `timeout` seconds pass first. With `changed_from`, a frame
+        captured before an action, frames still matching it are skipped, so
+        samples taken before the screen reacts cannot end the wait early.
+        The last frame of a successful wait is kept in `last_settled_frame`.
+        """
+        deadline = time.monotonic() + timeout
+        if min_wait:
+            time.sleep(min_wait)
+
+        reference = None
+        if changed_from is not None:
+            reference = self._stability_thumbnail(as_frame(changed_from).pixels)
+        previous = None
+        previous_time = None
+        stable = 0
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            frame = self.capture_frame(newer_than=previous_time)
+            if frame is not None:
+                previous_time = started
+                thumbnail = self._stability_thumbnail(frame)
+                if reference is not None:
+                    if thumbnail.shape == reference.shape and np.abs(thumbnail - reference).mean() < threshold:
+                        time.sleep(poll_interval)
+                        continue
+                    # The screen has reacted; settle from here
+                    reference = None
+                if previous is not None and thumbnail.shape == previous.shape \
+                        and np.abs(thumbnail - previous).mean() < threshold:
+                    stable += 1
+                    if stable >= stable_frames:
+                        self.last_settled_frame = frame
+                        return True
+                else:
+                    stable = 0
+                previous = thumbnail
+            time.sleep(poll_interval)
+
+        self.logger.debug(f"Screen did not settle within {timeout}s")
+        return False
+
+    @timed("wait_for_element")
+    def wait_for_element(self, name: str, timeout: float = 3.0, poll_interval: float = 0.05):
+        """Wait until a named UI element is visible and return its device position, or None on timeout"""
+        deadline = time.monotonic() + timeout
+        previous_time = None
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            frame = self.capture_frame(newer_than=previous_time)
+            if frame is not None:
+                position = self.ui_locator.locate(name, frame)
+                if position is not None:
+                    return self.display_geometry().to_device(*position, frame.shape[1], frame.shape[0])
+                previous_time = started
+            time.sleep(poll_interval)
+
+        self.logger.debug(f"{name} did not appear within {timeout}s")
+        return None
+
+    def element_position(self, name: str, frame=None):
+        """Return the device position of a named UI element, or None if it is not on screen"""
+        position = self.ui_locator.position_at(name, self.screen_width, self.screen_height)
+        if position is None:
+            if frame is None:
+                frame = self.capture_frame()
+            if frame is None:
+                self.logger.error(f"No frame to locate {name} in")
+                return None
+            frame = as_frame(frame)
+            position = self.ui_locator.locate(name, frame)
+            if position is not None:
+                position = self.display_geometry().to_device(*position, *frame.size)
+
+        if position is None:
+            self.logger.warning(f"UI element not found on screen: {name}")
+        return position
+
+    @timed("tap")
+    def tap_element(self, name: str, frame=None) -> bool:
+        """Tap a named UI element from the locator registry"""
+        if not self.connected:
+            return False
+
+        position = self.element_position(name, frame)
+        if position is None:
+            return False
+
+        self.tap(*position)
+        return True
+    
+    @timed("post_comment")
+    def post_comment(self, comment: Union[str, Future]) -> bool:
+        """Post a comment after liking; a pending comment is waited for once the keyboard is up"""
         if not self.connected:
             return False
         try:
-            # Click on the text input box (approximate position)
-            self.execute_command(f"input tap 540 1500")
-            time.sleep(1)  # Wait for keyboard to appear
-            
-            # Type the comment
-            comment = comment.replace(" ", "%s")
-            comment = comment.replace("'", "")
-            comment = comment.replace("’", "")
-            comment = comment.replace("!", "")
-            comment = comment.replace("-", "%s")
-            print(comment, 'commentttt')
-            self.execute_command(f'input text "{comment}"')
-            time.sleep(3)
+            # Click on the text input box and wait for the keyboard to appear,
+            # not just for a frame from before the tap to repeat itself
+            before = self.last_settled_frame
+            if not self.tap_element("comment_box"):
+                return False
+            self.wait_until_stable(timeout=2.0, changed_from=before)
+
+            if isinstance(comment, Future):
+                try:
+                    with span("model.join"):
+                        comment = comment.result()
+                except Exception as e:
+                    self.logger.error(f"Error generating comment: {e}")
+                    comment = None
+                if not comment:
+                    # Close the keyboard and the like dialog without sending
+                    self.execute_batch(["input keyevent KEYCODE_BACK", "input keyevent KEYCODE_BACK"])
+                    return False
             
-            # press back
-            self.execute_command(f"input tap 870 2300")
+            # Type the comment and close the keyboard in one shell round trip;
+            # ADBKeyBoard shows no keyboard, so there is nothing to close
+            then = []
+            if self.text_injector.shows_keyboard:
+                dismiss = self.element_position("keyboard_dismiss")
+                if dismiss is None:
+                    return False
+                then.append(f"input tap {dismiss[0]} {dismiss[1]}")
+            with span("type_comment"):
+                typed = self.text_injector.inject(comment, then=then)
+            if not typed:
+                self.logger.error("Typing comment failed")
+                return False
 
-            time.sleep(1)
+            self.wait_until_stable(timeout=3.0)
 
             # press submit
-            self.execute_command(f"input tap 540 1700")
+            if not self.tap_element("send_button"):
+                return False
 
-            time.sleep(2)
+            self.wait_until_stable(timeout=2.0)
             return True
         except Exception as e:
             self.logger.error(f"Error posting comment: {e}")
             return False
     
+    def _handle_screen_state(self, state: str, frame: Frame) -> bool:
+        """Act on a classified screen. Returns True if it is a profile to like."""
+        if state == PROFILE:
+            self._repeat_count = 0
+            return True
+
+        if state == REPEAT:
+            # The last like did not go through; retry a few times, then move on
+            self._repeat_count += 1
+            if self._repeat_count <= self.max_profile_retries:
+                return True
+            self.logger.warning("Same profile after repeated attempts, skipping it")
+            self._repeat_count = 0
+            self.tap_element("skip", frame)
+            self.wait_until_stable(timeout=2.0)
+            return False
+
+        if state == LOADING:
+            self.logger.info("Screen is loading, waiting")
+            self.wait_until_stable(timeout=3.0)
+        elif state in (MATCH, PROMO):
+            self.logger.info(f"Dismissing {state} screen")
+            self.execute_command("input keyevent KEYCODE_BACK")
+            self.wait_until_stable(timeout=2.0)
+        else:
+            self.logger.warning(f"Not a profile screen: {state}")
+        return False
+
+    @timed("send_chat_message")
+    def send_chat_message(self, message: str) -> bool:
+        """Type a reply into the open chat and send it, checking on screen that it left the input bar"""
+        if not self.connected:
+            return False
+        try:
+            before = self.last_settled_frame
+            if not self.tap_element("chat_input"):
+                return False
+            # Only a soft keyboard is sure to change the screen
+            keyboard = self.text_injector.shows_keyboard
+            send_name = "chat_send" if keyboard else "chat_send_docked"
+            self.wait_until_stable(timeout=2.0, changed_from=before if keyboard else None)
+
+            empty = self.capture_frame()
+            if empty is None:
+                self.logger.error("Failed to take screenshot")
+                return False
+            send = self.element_position(send_name)
+            if send is None:
+                return False
+
+            # Type the reply and press send in one shell round trip
+            with span("type_message"):
+                typed = self.text_injector.inject(message, then=[f"input tap {send[0]} {send[1]}"])
+            if not typed:
+                self.logger.error("Typing message failed")
+                return False
+
+            # The exit status only says the commands ran. A sent message shows
+            # up in the transcript and leaves the input bar as empty as before.
+            if not self.wait_until_stable(timeout=3.0, changed_from=empty):
+                self.logger.error("Chat did not change after sending")
+                return False
+            sent = self.last_settled_frame
+            if np.abs(self._anchor_band(sent, send_name) - self._anchor_band(empty, send_name)).mean() >= 2.0:
+                self.logger.error("Message is still in the input bar, the send tap missed")
+                return False
+            return True
+        except Exception as e:
+            self.logger.error(f"Error sending chat message: {e}")
+            return False
+    
+    @timed("like_and_comment")
     def like_and_comment(self) -> bool:
         """Like a profile and post a comment using GPT-4 Vision"""
         if not self.connected:
             self.logger.error("Not connected to device")
             return False
             
+        frame = None
+        success = False
         try:
-            # Take screenshot
-            screenshot_data = self.take_screenshot()
-            if not screenshot_data:
+            # Take screenshot (raw framebuffer when available); every stage
+            # below shares the views the Frame derives from it
+            pixels = self.capture_frame()
+            if pixels is None:
                 self.logger.error("Failed to take screenshot")
                 return False
-            
-            # Convert bytearray to PIL Image
-            screenshot = Image.open(BytesIO(screenshot_data))
-            screenshot.save("data/1/screenshot.png")
+            frame = Frame(pixels)
             
             self.logger.info("Successfully took screenshot")
             
+            # Only profiles go to the model, other screens are handled locally
+            with span("classify"):
+                self.last_screen_state = self.screen_classifier.classify(frame)
+            if not self._handle_screen_state(self.last_screen_state, frame):
+                return False
+            
+            # When pipelined, the model request goes out once the screen is known
+            # to be a profile to like and its heart is found; the locator keeps
+            # the match for the tap. It runs while the heart is tapped and the
+            # comment box opened, and is joined at post_comment.
+            pending_comment = None
+            if self.pipelined and not self.profile_scrolls:
+                with span("match.heart"):
+                    heart = self.ui_locator.locate("heart", frame)
+                if heart is None:
+                    self.logger.error("No heart button on screen")
+                    return False
+                pending_comment = self._request_comment(frame)
+            
             # Analyze screenshot
-            analysis = self.analyze_screenshot(screenshot)
+            if self.profile_scrolls:
+                # One request for the whole stitched profile, sent before scrolling back when pipelined
+                capture = self.capture_full_profile(frame)
+                stitched_config = self.profile_image_config._replace(crop=None)
+                if self.pipelined and self.ui_locator.locate("heart", capture.frames[0]) is not None:
+                    pending_comment = self._request_comment(capture.image, stitched_config)
+                frame, center = self.scroll_back(capture)
+                if (frame is None or center is None) and pending_comment is not None:
+                    # Nothing to like; drop the request if it has not started yet
+                    pending_comment.cancel()
+                if frame is None:
+                    self.logger.error("Failed to take screenshot")
+                    return False
+                analysis = {"heart_button": {"x": center[0], "y": center[1]}} if center else None
+                if analysis and pending_comment is None:
+                    analysis["suggested_comment"] = self.suggest_comment(capture.image, stitched_config)
+            elif pending_comment is None:
+                analysis = self.analyze_screenshot(frame)
+            else:
+                with span("match.heart"):
+                    center = self.ui_locator.locate("heart", frame)
+                analysis = {"heart_button": {"x": center[0], "y": center[1]}} if center else None
             if not analysis:
                 self.logger.error("Failed to analyze screenshot")
                 return False
@@ -225,13 +598,14 @@ class HingeAutomator(AndroidDeviceConnector):
                 self.logger.error("No heart button coordinates found in analysis")
                 return False
                 
-            if not self.click_heart_button(heart_button, "data/1/screenshot.png"):
+            if not self.click_heart_button(heart_button, frame.size, changed_from=frame):
                 self.logger.error("Failed to click heart button")
                 return False
+            self.screen_classifier.mark_processed(frame)
             self.logger.info("Successfully clicked heart button")
             
             # Post comment
-            suggested_comment = analysis.get("suggested_comment", "")
+            suggested_comment = pending_comment or analysis.get("suggested_comment", "")
             if not suggested_comment:
                 self.logger.error("No suggested comment found in analysis")
                 return False
@@ -241,85 +615,175 @@ class HingeAutomator(AndroidDeviceConnector):
                 return False
             self.logger.info("Successfully posted comment")
             
+            success = True
             return True
         except Exception as e:
             self.logger.error(f"Error in like_and_comment: {e}")
             return False
+        finally:
+            # Hand the frame to the background archiver, tagged with the outcome
+            if frame is not None:
+                self.archiver.submit(frame.pixels, failed=not success)
     
+    @timed("is_in_hinge_app")
     def is_in_hinge_app(self) -> bool:
         """Check if we're currently in the Hinge app"""
         if not self.connected:
             return False
         
         try:
-            # Get the current running app using dumpsys activity
-            output = self.execute_command("dumpsys activity top | grep ACTIVITY")
-            print(output, 'outputttt')
-            
-            # Split output into lines and get the last line
-            lines = output.strip().split('\n')
-            if not lines:
-                return False
-                
-            last_line = lines[-1]
-            print("Last line:", last_line)
-            
-            return self.HINGE_PACKAGE in last_line
+            package = self.foreground_package()
+            self.logger.debug(f"Foreground package: {package}")
+            return package == self.HINGE_PACKAGE
         except Exception as e:
             self.logger.error(f"Error checking current app: {e}")
             return False
 
+    @timed("analyze_chat")
     def analyze_chat(self, screenshot) -> Optional[list[str]]:
         """Analyze chat screenshot and suggest 5 replies using GPT-4 Vision"""
         try:
-            # Convert PIL Image to PNG bytes
-            img_byte_arr = BytesIO()
-            screenshot.save(img_byte_arr, format='PNG')
-            img_byte_arr = img_byte_arr.getvalue()
+            screenshot = as_frame(screenshot)
+            update = self.chat_context.plan(screenshot)
+            if update.unchanged and update.conversation.replies:
+                self.logger.info("No new messages, reusing the last suggestions")
+                return update.conversation.replies
+
+            # Reuse the replies for a chat that has not changed since the last call
+            prompt = self._chat_prompt(update)
+            cache_key = self.response_cache.make_key(
+                perceptual_hash(screenshot, update.config), prompt, self.VISION_MODEL
+            )
+            content = self.response_cache.get(cache_key)
+            if content is not None:
+                self.logger.info("Using cached chat analysis")
+            else:
+                content = self._generate_chat_replies(screenshot, update.config, prompt)
+                self.response_cache.set(cache_key, content)
+
+            suggested_replies, summary = parse_chat_replies(content)
+            self.chat_context.commit(update, suggested_replies, summary)
             
-            # Use OpenAI Vision to analyze the chat
-            base64_image = base64.b64encode(img_byte_arr).decode('utf-8')
+            self.logger.info(f"Generated {len(suggested_replies)} suggested replies")
+            
+            return suggested_replies
+                
+        except Exception as e:
+            self.logger.error(f"Error analyzing chat: {e}")
+            return None
+
+    def _chat_prompt(self, update: ChatUpdate) -> str:
+        """The chat prompt, preceded by the conversation summary when only new messages are sent"""
+        prompt = f"{self.CHAT_PROMPT}\n{self.CHAT_SUMMARY_INSTRUCTION}"
+        if update.incremental:
+            prompt = self.CHAT_UPDATE_PREFIX.format(summary=update.conversation.summary) + "\n" + prompt
+        return prompt
 
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4.1-mini",
+    @timed("model.chat")
+    def _generate_chat_replies(self, screenshot, config, prompt: str) -> str:
+        """Ask the vision model for reply suggestions to a chat screenshot, as CHAT_SCHEMA JSON"""
+        # Crop, downscale and encode the chat transcript for the vision model
+        with span("encode.chat"):
+            image = prepare_image(screenshot, config)
+        self.logger.info(f"Chat image: {image.width}x{image.height}, {image.num_bytes} bytes, ~{image.estimated_tokens} tokens")
+
+        response = self.model_client.complete(
+            model=self.VISION_MODEL,
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": prompt
+                        },
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": image.data_url,
+                                "detail": image.detail
+                            }
+                        }
+                    ]
+                }
+            ],
+            max_tokens=500,
+            response_format=response_format("chat_replies", CHAT_SCHEMA)
+        )
+
+        return response.choices[0].message.content
+
+    def stream_chat_replies(self, screenshot):
+        """Yield suggested replies for a chat screenshot as soon as each one is generated"""
+        screenshot = as_frame(screenshot)
+        update = self.chat_context.plan(screenshot)
+        if update.unchanged and update.conversation.replies:
+            self.logger.info("No new messages, reusing the last suggestions")
+            yield from update.conversation.replies
+            return
+
+        prompt = self._chat_prompt(update)
+        cache_key = self.response_cache.make_key(
+            perceptual_hash(screenshot, update.config), prompt, self.VISION_MODEL
+        )
+        content = self.response_cache.get(cache_key)
+        if content is not None:
+            self.logger.info("Using cached chat analysis")
+            replies, summary = parse_chat_replies(content)
+            self.chat_context.commit(update, replies, summary)
+            yield from replies
+            return
+
+        with span("encode.chat"):
+            image = prepare_image(screenshot, update.config)
+        self.logger.info(f"Chat image: {image.width}x{image.height}, {image.num_bytes} bytes, ~{image.estimated_tokens} tokens")
+
+        # Opening the stream and reading it to the end; the caller's work
+        # between replies is included, as it is only printing or collecting them
+        with span("model.chat"):
+            stream = self.model_client.complete(
+                model=self.VISION_MODEL,
                 messages=[
                     {
                         "role": "user",
                         "content": [
                             {
                                 "type": "text",
-                                "text": """Analyze this Hinge chat conversation and suggest 5 different natural, engaging replies. 
-                                Each reply should be:
-                                1. Contextually relevant to the conversation
-                                2. Flirty but not overly sexual
-                                3. Show personality and humor
-                                4. Keep it concise (1-2 sentences max)
-                                5. End with a question to keep the conversation going
-                                
-                                Format the response as a numbered list (1-5) with each reply on a new line.
-                                Do not use any punctuation other than ',', '.', '?' """
+                                "text": prompt
                             },
                             {
                                 "type": "image_url",
                                 "image_url": {
-                                    "url": f"data:image/png;base64,{base64_image}"
+                                    "url": image.data_url,
+                                    "detail": image.detail
                                 }
                             }
                         ]
                     }
                 ],
-                max_tokens=500
+                max_tokens=500,
+                response_format=response_format("chat_replies", CHAT_SCHEMA),
+                stream=True
             )
 
-            # Split the response into individual replies
-            suggested_replies = response.choices[0].message.content.strip().split('\n')
-            # Clean up the replies (remove numbers and extra whitespace)
-            suggested_replies = [reply.strip().lstrip('12345. ') for reply in suggested_replies if reply.strip()]
-            
-            self.logger.info(f"Generated {len(suggested_replies)} suggested replies")
-            
-            return suggested_replies[:5]  # Ensure we only return 5 replies
-                
-        except Exception as e:
-            self.logger.error(f"Error analyzing chat: {e}")
-            return None
+            content = ""
+            received = 0
+            replies = []
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                content += chunk.choices[0].delta.content or ""
+                # Hand out every reply whose string has closed right away
+                completed = completed_replies(content)
+                for reply in completed[received:]:
+                    if reply.strip() and len(replies) < 5:
+                        replies.append(reply.strip())
+                        yield reply.strip()
+                received = len(completed)
+
+        final_replies, summary = parse_chat_replies(content)
+        self.response_cache.set(cache_key, content)
+        for reply in final_replies[len(replies):]:
+            replies.append(reply)
+            yield reply
+        self.chat_context.commit(update, replies, summary)
@@ -0,0 +1,288 @@
+"""Microbenchmarks of the local per-frame image work, with regression gates.
+
+    python image_benchmark.py
+    python image_benchmark.py --resolutions 1080p --repeats 50
+    python image_benchmark.py --save-baseline
+
+Synthetic screenshots at common phone resolutions carry the heart and skip
+templates from data/ at known positions. Each stage is timed, taking the
+best of `--repeats` runs after a warm-up as the figure least disturbed by
+other load. Memory is measured twice: tracemalloc sees Python and numpy
+allocations only, so on Linux the growth of resident memory over a run is
+also taken, which includes what Pillow and OpenCV allocate natively. The
+peak is reset through /proc/self/clear_refs and freed heap memory handed
+back first, so earlier stages do not hide it. Elsewhere only the traced
+peak is gated. The
+template matches are checked against the embedded positions. The run exits non-zero when a match is wrong or a stage is
+slower, or allocates more, than the stored baseline allows. No device or
+API key is needed.
+"""
+import argparse
+import base64
+import ctypes
+import ctypes.util
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+import cv2
+import numpy as np
+from PIL import Image
+from android_connector import RAW_FORMAT_RGBA_8888, parse_raw_screencap
+from frame import Frame
+from image_prep import CHAT_IMAGE_CONFIG, PROFILE_IMAGE_CONFIG, perceptual_hash, prepare_image
+from shape_matcher import REFERENCE_WIDTH, find_shape_coordinates
+from ui_locator import DEFAULT_ANCHORS, UILocator
+
+RESOLUTIONS = {
+    "720p": (720, 1600),
+    "1080p": (1080, 2400),
+    "1440p": (1440, 3200),
+}
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "image_benchmark_baseline.json")
+
+ANCHORS = {anchor.name: anchor for anchor in DEFAULT_ANCHORS}
+# Where the templates are drawn, as fractions of the frame size; skip must lie in its search region
+TEMPLATE_POSITIONS = {"heart": (0.86, 0.62), "skip": (0.14, 0.9)}
+
+# Slack on top of the relative tolerances, so sub-millisecond stages and
+# small allocations do not fail on noise
+TIME_SLACK_MS = 0.2
+MEMORY_SLACK_KB = 64
+# Resident memory also moves with interpreter and allocator bookkeeping
+RESIDENT_SLACK_KB = 256
+
+
+class StageResult(NamedTuple):
+    ms: float
+    peak_kb: float
+    # Growth of resident memory, None where it cannot be measured
+    resident_kb: Optional[float] = None
+
+
+def _libc():
+    try:
+        return ctypes.CDLL(ctypes.util.find_library("c"))
+    except OSError:
+        return None
+
+
+LIBC = _libc() if sys.platform.startswith("linux") else None
+
+
+def _memory_status() -> Dict[str, int]:
+    with open("/proc/self/status") as f:
+        return {key: int(value.split()[0]) for key, _, value in (line.partition(":") for line in f)
+                if key in ("VmRSS", "VmHWM")}
+
+
+def resident_growth(stage: Callable) -> Optional[float]:
+    """Peak resident memory over a run of `stage` minus the resident memory before it, in KiB"""
+    if LIBC is None:
+        return None
+    gc.collect()
+    # glibc only; return freed heap pages so reusing them shows up as growth
+    if hasattr(LIBC, "malloc_trim"):
+        LIBC.malloc_trim(0)
+    try:
+        # Reset the high-water mark to the current resident size
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        before = _memory_status()["VmRSS"]
+    except OSError:
+        return None
+    stage()
+    return max(0.0, float(_memory_status()["VmHWM"] - before))
+
+
+def synthetic_screenshot(width: int, height: int, seed: int = 0) -> Tuple[np.ndarray, Dict[str, Tuple[int, int]]]:
+    """Return an RGBA profile-like screenshot and the centers of the templates drawn into it"""
+    rng = np.random.default_rng(seed)
+    pixels = np.full((height, width, 4), 255, np.uint8)
+
+    # Photo blocks of smooth noise with prompt text between them
+    y = int(0.06 * height)
+    while y < height:
+        block = int(rng.integers(height // 6, height // 3))
+        noise = rng.integers(0, 256, (8, 6, 3), np.uint8)
+        pixels[y:y + block, :, :3] = cv2.resize(noise, (width, block), interpolation=cv2.INTER_CUBIC)[:height - y]
+        y += block
+        for line in range(2):
+            cv2.putText(pixels, f"prompt {rng.integers(1000)} about something", (width // 20, y + (line + 1) * height // 40),
+                        cv2.FONT_HERSHEY_SIMPLEX, width / 900, (40, 40, 40, 255), max(1, width // 500))
+        y += height // 12
+
+    expected = {}
+    for name, (fx, fy) in TEMPLATE_POSITIONS.items():
+        template = np.asarray(Image.open(ANCHORS[name].template_path).convert("RGBA"))
+        scale = width / REFERENCE_WIDTH
+        size = (max(1, round(template.shape[1] * scale)), max(1, round(template.shape[0] * scale)))
+        if size != template.shape[1::-1]:
+            template = cv2.resize(template, size, interpolation=cv2.INTER_AREA)
+        t_h, t_w = template.shape[:2]
+        left, top = int(fx * width) - t_w // 2, int(fy * height) - t_h // 2
+
+        # Color channels only, as the matcher reads the template
+        pixels[top:top + t_h, left:left + t_w, :3] = template[..., :3]
+        expected[name] = (left + t_w // 2, top + t_h // 2)
+    return pixels, expected
+
+
+def raw_screencap(pixels: np.ndarray) -> bytes:
+    """Encode RGBA pixels the way `screencap` without -p writes them"""
+    height, width = pixels.shape[:2]
+    return np.array([width, height, RAW_FORMAT_RGBA_8888, 0], "<u4").tobytes() + pixels.tobytes()
+
+
+def stages(pixels: np.ndarray) -> Dict[str, Callable]:
+    """The per-frame stages, each on a fresh Frame so nothing is served from its memo"""
+    png = BytesIO()
+    Image.fromarray(pixels).save(png, format="PNG", compress_level=1)
+    png = png.getvalue()
+    raw = raw_screencap(pixels)
+    gray = Frame(pixels).gray
+    jpeg = base64.b64decode(prepare_image(Frame(pixels), PROFILE_IMAGE_CONFIG).data_url.split(",", 1)[1])
+    locator = UILocator()
+
+    def locate_all():
+        locator.invalidate()
+        return locator.locate_all(Frame(pixels))
+
+    return {
+        "decode.png": lambda: np.asarray(Image.open(BytesIO(png))),
+        "decode.raw": lambda: parse_raw_screencap(raw),
+        "grayscale": lambda: Frame(pixels).gray,
+        "match.heart": lambda: find_shape_coordinates(ANCHORS["heart"].template_path, gray, ANCHORS["heart"].region),
+        "match.skip": lambda: find_shape_coordinates(ANCHORS["skip"].template_path, gray, ANCHORS["skip"].region),
+        "locate_all": locate_all,
+        "hash.profile": lambda: perceptual_hash(Frame(pixels), PROFILE_IMAGE_CONFIG),
+        "encode.profile": lambda: prepare_image(Frame(pixels), PROFILE_IMAGE_CONFIG),
+        "encode.chat": lambda: prepare_image(Frame(pixels), CHAT_IMAGE_CONFIG),
+        "encode.png": lambda: prepare_image(Frame(pixels), PROFILE_IMAGE_CONFIG._replace(format="PNG")),
+        "base64": lambda: base64.b64encode(jpeg),
+    }
+
+
+def measure(stage: Callable, repeats: int) -> StageResult:
+    stage()
+    durations = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        stage()
+        durations.append(time.perf_counter() - started)
+
+    # Separate run, tracing slows the stage down
+    tracemalloc.start()
+    try:
+        stage()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return StageResult(min(durations) * 1000, peak / 1024, resident_growth(stage))
+
+
+def check_matches(pixels: np.ndarray, expected: Dict[str, Tuple[int, int]]) -> list:
+    """Return a description of every template found away from where it was drawn"""
+    errors = []
+    tolerance = max(2, pixels.shape[1] // 360)
+    positions = UILocator().locate_all(Frame(pixels))
+    for name, (x, y) in expected.items():
+        found = positions.get(name)
+        if found is None or abs(found[0] - x) > tolerance or abs(found[1] - y) > tolerance:
+            errors.append(f"{name}: expected ({x}, {y}), found {found}")
+    return errors
+
+
+def compare(results: Dict[str, StageResult], baseline: Dict[str, dict], time_tolerance: float,
+            memory_tolerance: float) -> Dict[str, list]:
+    """Return descriptions of the regressions of every stage past its baseline"""
+    regressions = {}
+    for key, result in results.items():
+        reference = baseline.get(key)
+        if reference is None:
+            continue
+        time_limit = reference["ms"] * (1 + time_tolerance) + TIME_SLACK_MS
+        memory_limit = reference["peak_kb"] * (1 + memory_tolerance) + MEMORY_SLACK_KB
+        if result.ms > time_limit:
+            regressions.setdefault(key, []).append(f"{key}: {result.ms:.2f} ms, baseline {reference['ms']:.2f} ms")
+        if result.peak_kb > memory_limit:
+            regressions.setdefault(key, []).append(
+                f"{key}: {result.peak_kb:.0f} KiB peak, baseline {reference['peak_kb']:.0f} KiB")
+        if result.resident_kb is not None and reference.get("resident_kb") is not None \
+                and result.resident_kb > reference["resident_kb"] * (1 + memory_tolerance) + RESIDENT_SLACK_KB:
+            regressions.setdefault(key, []).append(
+                f"{key}: {result.resident_kb:.0f} KiB resident, baseline {reference['resident_kb']:.0f} KiB")
+    return regressions
+
+
+def environment() -> dict:
+    return {
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "pillow": Image.__version__,
+    }
+
+
+def run(resolutions, repeats: int = 20, baseline_path: str = BASELINE_PATH, save_baseline: bool = False,
+        time_tolerance: float = 0.5, memory_tolerance: float = 0.1) -> bool:
+    results = {}
+    functions = {}
+    failures = []
+    for name in resolutions:
+        width, height = RESOLUTIONS[name]
+        pixels, expected = synthetic_screenshot(width, height)
+        failures += [f"{name} {error}" for error in check_matches(pixels, expected)]
+
+        print(f"{name} ({width}x{height})")
+        for stage, function in stages(pixels).items():
+            functions[f"{name}/{stage}"] = function
+            result = results[f"{name}/{stage}"] = measure(function, repeats)
+            resident = "" if result.resident_kb is None else f"  {result.resident_kb:8.0f} KiB resident"
+            print(f"  {stage:16} {result.ms:8.2f} ms  {result.peak_kb:8.0f} KiB peak{resident}")
+
+    if save_baseline:
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump({"environment": environment(),
+                       "stages": {key: result._asdict() for key, result in results.items()}}, f, indent=2)
+            f.write("\n")
+        print(f"Saved baseline to {baseline_path}")
+    elif os.path.exists(baseline_path):
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("environment") != environment():
+            print(f"Baseline was recorded on {baseline.get('environment')}, timings may not compare")
+        regressions = compare(results, baseline["stages"], time_tolerance, memory_tolerance)
+        if regressions:
+            # Measure again before failing, a burst of load elsewhere can slow any one stage
+            retried = {key: measure(functions[key], repeats * 2) for key in regressions}
+            regressions = compare(retried, baseline["stages"], time_tolerance, memory_tolerance)
+        failures += [regression for messages in regressions.values() for regression in messages]
+    else:
+        print(f"No baseline at {baseline_path}, run with --save-baseline to record one")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return not failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the per-frame image stages against a stored baseline")
+    parser.add_argument("--resolutions", nargs="+", choices=list(RESOLUTIONS), default=list(RESOLUTIONS),
+                        help="Screen sizes to generate")
+    parser.add_argument("--repeats", type=int, default=20, help="Timed runs per stage; the best is reported")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Record this run as the baseline instead of checking it")
+    parser.add_argument("--time-tolerance", type=float, default=0.5, help="Allowed slowdown over the baseline, as a fraction")
+    parser.add_argument("--memory-tolerance", type=float, default=0.1, help="Allowed growth of peak allocations, as a fraction")
+    args = parser.parse_args()
+    passed = run(args.resolutions, args.repeats, args.baseline, args.save_baseline,
+                 args.time_tolerance, args.memory_tolerance)
+    sys.exit(0 if passed else 1)
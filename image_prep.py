@@ -0,0 +1,135 @@
+import base64
+import math
+from io import BytesIO
+from typing import List, NamedTuple, Optional, Tuple
+import cv2
+import numpy as np
+from PIL import Image
+from frame import Frame, as_frame
+
+
+class ImagePrepConfig(NamedTuple):
+    """How a screenshot is prepared before it is sent to the vision model.
+
+    `crop` is (left, top, right, bottom) as fractions of the frame size.
+    `max_long_edge` caps the longer side after cropping; None keeps it as is.
+    """
+    crop: Optional[Tuple[float, float, float, float]] = None
+    max_long_edge: Optional[int] = 1024
+    format: str = "JPEG"
+    quality: int = 80
+    detail: str = "auto"
+
+
+class PreparedImage(NamedTuple):
+    data_url: str
+    detail: str
+    width: int
+    height: int
+    num_bytes: int
+    estimated_tokens: int
+
+
+# Profile card without the status and navigation bars
+PROFILE_IMAGE_CONFIG = ImagePrepConfig(crop=(0.0, 0.04, 1.0, 0.92))
+# Chat transcript without the header and the message input box
+CHAT_IMAGE_CONFIG = ImagePrepConfig(crop=(0.0, 0.1, 1.0, 0.88), max_long_edge=1280)
+
+_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+
+def estimate_image_tokens(width: int, height: int, detail: str) -> int:
+    """Estimate vision input tokens using OpenAI's 512px tile accounting"""
+    if detail == "low":
+        return 85
+
+    # High detail: fit in 2048x2048, then scale the short side down to 768
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def _crop_box(size, crop):
+    left, top, right, bottom = crop
+    width, height = size
+    return int(left * width), int(top * height), int(right * width), int(bottom * height)
+
+
+def perceptual_hash(screenshot, config: ImagePrepConfig = ImagePrepConfig(), hash_size: int = 16) -> int:
+    """Difference hash (hash_size**2 bits) of the region `prepare_image` would send.
+
+    Screens that look the same hash the same even when their encoded
+    bytes differ, so the hash can key a cache of model responses.
+    """
+    frame = as_frame(screenshot)
+    return frame.memo(("perceptual_hash", config.crop, hash_size), lambda: _difference_hash(frame, config.crop, hash_size))
+
+
+def _difference_hash(frame, crop, hash_size):
+    gray = frame.gray
+    if crop:
+        left, top, right, bottom = _crop_box(frame.size, crop)
+        gray = gray[top:bottom, left:right]
+
+    pixels = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA).astype(np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def prepare_image(screenshot, config: ImagePrepConfig = ImagePrepConfig()) -> PreparedImage:
+    """Crop, downscale and encode a screenshot into a base64 data URL"""
+    frame = as_frame(screenshot)
+    return frame.memo(("prepared_image", config), lambda: _prepare(frame, config))
+
+
+def prepare_tiles(screenshot, config: ImagePrepConfig = ImagePrepConfig(), max_aspect: float = 2.0) -> List[PreparedImage]:
+    """Like `prepare_image`, but a region taller than `max_aspect` times its
+    width is split into tiles of equal height, so a stitched profile is not
+    downscaled to a sliver"""
+    frame = as_frame(screenshot)
+    return frame.memo(("prepared_tiles", config, max_aspect), lambda: _tiles(frame, config, max_aspect))
+
+
+def _tiles(frame, config, max_aspect):
+    left, top, right, bottom = _crop_box(frame.size, config.crop) if config.crop else (0, 0, *frame.size)
+    count = max(1, math.ceil((bottom - top) / ((right - left) * max_aspect)))
+    if count == 1:
+        return [prepare_image(frame, config)]
+
+    bounds = np.linspace(top, bottom, count + 1).round().astype(int)
+    tile_config = config._replace(crop=None)
+    return [prepare_image(Frame(np.ascontiguousarray(frame.pixels[start:end, left:right])), tile_config)
+            for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def _prepare(frame, config):
+    image = frame.image
+    if config.crop:
+        image = image.crop(_crop_box(frame.size, config.crop))
+
+    if config.max_long_edge and max(image.size) > config.max_long_edge:
+        scale = config.max_long_edge / max(image.size)
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        image = image.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+
+    image_format = config.format.upper()
+    if image_format == "JPEG" and image.mode != "RGB":
+        image = image.convert("RGB")
+
+    buffer = BytesIO()
+    if image_format == "PNG":
+        image.save(buffer, format=image_format)
+    else:
+        image.save(buffer, format=image_format, quality=config.quality)
+    data = buffer.getvalue()
+
+    return PreparedImage(
+        data_url=f"data:{_MIME_TYPES[image_format]};base64,{base64.b64encode(data).decode('ascii')}",
+        detail=config.detail,
+        width=image.width,
+        height=image.height,
+        num_bytes=len(data),
+        estimated_tokens=estimate_image_tokens(image.width, image.height, config.detail),
+    )
\ No newline at end of file
@@ -1,12 +1,13 @@
 import logging
-from hinge_automator import HingeAutomator
+from timing import timings
 import os
 import time
-import random
 from dotenv import load_dotenv
 import argparse
-from PIL import Image
-from io import BytesIO
+
+# cv2, numpy, PIL and the automator are imported once a mode starts, and
+# openai on the first model call, so `--help` and argument errors are instant.
+# Measure with `python startup_benchmark.py`.
 
 # Load environment variables from .env file
 load_dotenv()
@@ -18,8 +19,42 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 
-def chat_mode(automator):
+def load_automator(record=False):
+    """Import and return the automator class"""
+    if record:
+        from replay import RecordingHingeAutomator
+        return RecordingHingeAutomator
+    from hinge_automator import HingeAutomator
+    return HingeAutomator
+
+
+def choose_reply(automator, suggested_replies):
+    """Ask the user which suggestion to send and send it"""
+    # Ask user which reply they want to send
+    while True:
+        try:
+            choice = input("\nEnter the number of the reply you want to send (1-5), or 'n' to skip: ")
+            if choice.lower() == 'n':
+                break
+            
+            choice_num = int(choice)
+            if 1 <= choice_num <= len(suggested_replies):
+                selected_reply = suggested_replies[choice_num - 1]
+                if automator.send_chat_message(selected_reply):
+                    print("Message sent successfully!")
+                else:
+                    print("Failed to send message")
+                break
+            else:
+                print("Please enter a number between 1 and 5")
+        except ValueError:
+            print("Please enter a valid number or 'n' to skip")
+
+
+def chat_mode(automator, watcher=None):
     """Handle chat mode - analyze chat and suggest replies"""
+    from frame import Frame
+
     print("\nChat mode activated. Navigate to the chat you want to reply to.")
     print("Press Ctrl+C to exit chat mode.")
     
@@ -27,44 +62,44 @@ def chat_mode(automator):
         while True:
             input("\nPress Enter when you're ready to analyze the chat and get reply suggestions...")
             
-            # Take screenshot
-            screenshot_data = automator.take_screenshot()
-            if not screenshot_data:
+            # Suggestions prepared in the background while the user was reading
+            if watcher is not None:
+                try:
+                    suggested_replies = watcher.suggestions() or []
+                except Exception as e:
+                    logging.error(f"Error analyzing chat: {e}")
+                    suggested_replies = []
+                if not suggested_replies:
+                    print("Failed to analyze chat")
+                    continue
+                print("\nSuggested replies:")
+                for i, reply in enumerate(suggested_replies, 1):
+                    print(f"\n{i}. {reply}")
+                choose_reply(automator, suggested_replies)
+                continue
+            
+            # Take screenshot (served from the frame stream when it is running)
+            pixels = automator.capture_frame()
+            if pixels is None:
                 print("Failed to take screenshot")
                 continue
             
-            # Convert bytearray to PIL Image
-            screenshot = Image.open(BytesIO(screenshot_data))
+            screenshot = Frame(pixels)
             
-            # Analyze chat and get reply suggestions
-            suggested_replies = automator.analyze_chat(screenshot)
+            # Stream reply suggestions, printing each one as soon as it is ready
+            print("\nSuggested replies:")
+            suggested_replies = []
+            try:
+                for reply in automator.stream_chat_replies(screenshot):
+                    suggested_replies.append(reply)
+                    print(f"\n{len(suggested_replies)}. {reply}", flush=True)
+            except Exception as e:
+                logging.error(f"Error analyzing chat: {e}")
             if not suggested_replies:
                 print("Failed to analyze chat")
                 continue
             
-            print("\nSuggested replies:")
-            for i, reply in enumerate(suggested_replies, 1):
-                print(f"\n{i}. {reply}")
-            
-            # Ask user which reply they want to send
-            while True:
-                try:
-                    choice = input("\nEnter the number of the reply you want to send (1-5), or 'n' to skip: ")
-                    if choice.lower() == 'n':
-                        break
-                    
-                    choice_num = int(choice)
-                    if 1 <= choice_num <= len(suggested_replies):
-                        selected_reply = suggested_replies[choice_num - 1]
-                        if automator.send_chat_message(selected_reply):
-                            print("Message sent successfully!")
-                        else:
-                            print("Failed to send message")
-                        break
-                    else:
-                        print("Please enter a number between 1 and 5")
-                except ValueError:
-                    print("Please enter a valid number or 'n' to skip")
+            choose_reply(automator, suggested_replies)
             
             time.sleep(1)  # Small delay before next iteration
     
@@ -72,8 +107,14 @@ def chat_mode(automator):
         print("\nExiting chat mode...")
 
 
-def swipe_mode(automator):
+def swipe_mode(automator, max_unknown=5):
     """Handle swipe mode - like and comment on profiles"""
+    from screen_classifier import OUT_OF_LIKES, UNKNOWN
+
+    if OUT_OF_LIKES not in automator.screen_classifier.reference_labels:
+        print("No out of likes reference screenshot in data/screens, stopping after "
+              f"{max_unknown} unrecognised screens in a row instead (see screen_classifier.py)")
+    unknown_in_a_row = 0
     try:
         # Perform likes with comments
         for i in range(1000):
@@ -87,11 +128,20 @@ def swipe_mode(automator):
             # Like and comment using GPT-4 Vision
             if automator.like_and_comment():
                 print("Successfully liked and commented on profile")
+            elif automator.last_screen_state == OUT_OF_LIKES:
+                print("Out of likes. Exiting...")
+                break
             else:
                 print("Failed to like and comment on profile")
             
-            # Wait a bit before the next profile
-            time.sleep(random.uniform(2, 4))
+            # A screen nothing recognises, such as a paywall, does not go away by waiting
+            unknown_in_a_row = unknown_in_a_row + 1 if automator.last_screen_state == UNKNOWN else 0
+            if unknown_in_a_row >= max_unknown:
+                print(f"No profile recognised on {unknown_in_a_row} screens in a row, possibly out of likes. Exiting...")
+                break
+            
+            # Wait for the next profile to finish loading
+            automator.wait_until_stable(timeout=4.0)
     
     except KeyboardInterrupt:
         print("\nStopping automation...")
@@ -102,10 +152,32 @@ def main():
     # Parse command line arguments
     parser = argparse.ArgumentParser(description='Hinge Automation Tool')
     parser.add_argument('mode', choices=['swipe', 'chat'], help='Mode to run the tool in')
+    parser.add_argument('--stream', action='store_true', help='Capture frames continuously in the background')
+    parser.add_argument('--stream-interval', type=float, default=0.2, metavar='SECONDS', help='Pause between background captures')
+    parser.add_argument('--pipeline', action='store_true', help='Request each comment while the profile is liked and the comment box opened')
+    parser.add_argument('--max-unknown', type=int, default=5, metavar='N', help='Stop swiping after N unrecognised screens in a row')
+    parser.add_argument('--full-profile', type=int, default=0, metavar='N', help='Scroll up to N screens into each profile and comment on all of it in one request')
+    parser.add_argument('--watch-focus', action='store_true', help='Track the foreground app from logcat instead of polling')
+    parser.add_argument('--watch-chat', action='store_true', help='In chat mode, prepare suggestions in the background when a new message arrives')
+    parser.add_argument('--archive', choices=['all', 'failures', 'off'], default='all', help='Which profile screenshots to keep in data/archive')
+    parser.add_argument('--record', metavar='DIR', help='Record frames, shell commands and model responses to DIR for replay.py')
+    parser.add_argument('--profile', action='store_true', help='Time each stage and print a summary on exit')
+    parser.add_argument('--profile-export', metavar='PATH', help='Also write stage timings to PATH (.prom for Prometheus text, JSONL otherwise)')
+    parser.add_argument('--startup-only', action='store_true', help='Create the automator and exit before touching the device (see startup_benchmark.py)')
     args = parser.parse_args()
     
+    timings.enabled = args.profile or bool(args.profile_export)
+    
     # Create an instance of HingeAutomator
-    automator = HingeAutomator(openai_api_key=openai_api_key)
+    automator_class = load_automator(record=bool(args.record))
+    automator = automator_class(openai_api_key=openai_api_key)
+    if args.record:
+        automator.start_recording(args.record)
+    if args.startup_only:
+        return
+    
+    # Create the model client while the device connects and the app launches
+    automator.model_client.warm_up()
     
     # List available devices
     devices = automator.list_devices()
@@ -134,11 +206,46 @@ def main():
     
     print("Hinge launched successfully")
     
+    # Switch the keyboard once, before the first message is typed
+    print(f"Typing with {automator.text_injector.activate()}")
+    
+    automator.pipelined = args.pipeline
+    automator.profile_scrolls = args.full_profile
+    automator.archiver.enabled = args.archive != 'off'
+    automator.archiver.failures_only = args.archive == 'failures'
+    
+    if args.stream:
+        automator.start_stream(args.stream_interval)
+    if args.watch_focus:
+        automator.start_foreground_watcher()
+    
     # Run in selected mode
-    if args.mode == 'chat':
-        chat_mode(automator)
-    else:
-        swipe_mode(automator)
+    watcher = None
+    try:
+        if args.mode == 'chat':
+            if args.watch_chat:
+                from chat_watcher import ChatWatcher
+                watcher = ChatWatcher(automator)
+                watcher.start()
+            chat_mode(automator, watcher)
+        else:
+            swipe_mode(automator, args.max_unknown)
+    finally:
+        if watcher is not None:
+            watcher.stop()
+            print(f"Chat suggestions prepared: {watcher.speculated}, abandoned: {watcher.cancelled}")
+        automator.stop_stream()
+        automator.stop_foreground_watcher()
+        automator.archiver.stop()
+        automator.text_injector.restore()
+        print(f"Response cache: {automator.response_cache.stats()}")
+        print(f"Model calls: {automator.model_client.stats()}")
+        if automator.screen_classifier.counts:
+            print(f"Screen states: {dict(automator.screen_classifier.counts)}")
+        if timings.enabled:
+            print(f"\nStage timings:\n{timings.summary()}")
+            if args.profile_export:
+                timings.export(args.profile_export)
 
 if __name__ == "__main__":
     main()
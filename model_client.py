@@ -0,0 +1,191 @@
+import logging
+import random
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+RESET_PATTERN = re.compile(r"([\d.]+)(ms|h|m|s)")
+RESET_UNITS = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+
+
+def retry_after(error) -> Optional[float]:
+    """Seconds the server asked us to wait before retrying, or None"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    for header, divisor in (("retry-after-ms", 1000), ("retry-after", 1)):
+        value = headers.get(header)
+        if value is None:
+            continue
+        try:
+            return max(0.0, float(value) / divisor)
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+
+    # The reset headers come with every response and describe the budget,
+    # not this error, so they only count on a rate limit with a budget spent
+    if getattr(error, "status_code", None) != 429:
+        return None
+    waits = []
+    for budget in ("requests", "tokens"):
+        # e.g. "6m0s", "1.5s" or "250ms" until the budget resets
+        value = headers.get(f"x-ratelimit-reset-{budget}")
+        if headers.get(f"x-ratelimit-remaining-{budget}") == "0" and value:
+            parts = RESET_PATTERN.findall(value)
+            if parts:
+                waits.append(sum(float(number) * RESET_UNITS[unit] for number, unit in parts))
+    return max(waits) if waits else None
+
+
+class ModelClient:
+    """Chat completions through one shared client, with deadlines, retries and usage accounting.
+
+    Every call goes through the same OpenAI client, so its keep-alive
+    connection pool is reused, and the SDK's own retries are left off in
+    favour of ours. Unless one is passed in, the client is created, and the
+    openai package imported, on first use or by `warm_up`. A call is retried on rate limits, timeouts, dropped
+    connections and 5xx responses with jittered exponential backoff, waiting
+    at least as long as the server's Retry-After header asks, and gives up
+    once `deadline` seconds have passed since it started. Latency and token
+    counts of every call are kept for `stats`.
+    """
+
+    def __init__(self, client=None, api_key: Optional[str] = None, timeout: float = 30.0, deadline: float = 60.0, max_attempts: int = 4,
+                 base_delay: float = 0.5, max_delay: float = 20.0):
+        self._client = client
+        self.api_key = api_key
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.logger = logging.getLogger(__name__)
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latencies = []
+        self._lock = threading.Lock()
+        self._client_lock = threading.Lock()
+        self._retryable = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from openai import OpenAI
+                    self._client = OpenAI(api_key=self.api_key, max_retries=0)
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    def warm_up(self):
+        """Create the client in a background thread so the first call does not wait for it"""
+        threading.Thread(target=lambda: self.client, daemon=True).start()
+
+    def retryable_errors(self):
+        """Errors worth another attempt; anything else (bad request, auth) fails at once"""
+        if self._retryable is None:
+            import openai
+            self._retryable = (openai.RateLimitError, openai.APITimeoutError,
+                               openai.APIConnectionError, openai.InternalServerError)
+        return self._retryable
+
+    def backoff(self, attempt: int, error) -> float:
+        """Delay before retry number `attempt`, never shorter than Retry-After"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        requested = retry_after(error)
+        if requested is not None:
+            delay = max(delay, requested)
+        return delay
+
+    def complete(self, **kwargs):
+        """Create a chat completion, retrying transient failures.
+
+        Takes the arguments of `chat.completions.create`. With `stream=True`
+        the stream is returned once it opens and usage is counted as it is
+        consumed; a stream that breaks midway is not retried.
+        """
+        started = time.monotonic()
+        deadline = started + self.deadline
+        if kwargs.get("stream"):
+            kwargs.setdefault("stream_options", {"include_usage": True})
+
+        client = self.client
+        retryable = self.retryable_errors()
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                response = client.chat.completions.create(timeout=min(self.timeout, max(remaining, 0.1)), **kwargs)
+                break
+            except retryable as e:
+                attempt += 1
+                delay = self.backoff(attempt - 1, e)
+                if attempt >= self.max_attempts or time.monotonic() + delay >= deadline:
+                    self.logger.error(f"Model call failed after {attempt} attempts: {e}")
+                    with self._lock:
+                        self.calls += 1
+                        self.failures += 1
+                    raise
+                self.logger.warning(f"Model call failed ({type(e).__name__}), retrying in {delay:.2f}s")
+                with self._lock:
+                    self.retries += 1
+                time.sleep(delay)
+            except Exception:
+                with self._lock:
+                    self.calls += 1
+                    self.failures += 1
+                raise
+
+        if kwargs.get("stream"):
+            return self._count_stream(response, started, kwargs.get("model"))
+        self._account(getattr(response, "usage", None), time.monotonic() - started, kwargs.get("model"))
+        return response
+
+    def _count_stream(self, stream, started, model):
+        usage = None
+        for chunk in stream:
+            if getattr(chunk, "usage", None) is not None:
+                usage = chunk.usage
+            yield chunk
+        self._account(usage, time.monotonic() - started, model)
+
+    def _account(self, usage, latency: float, model: Optional[str] = None):
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        if usage is not None:
+            self.logger.info(f"{model} call: {latency:.2f}s, {prompt_tokens} prompt + {completion_tokens} completion tokens")
+        with self._lock:
+            self.calls += 1
+            self.latencies.append(latency)
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    def stats(self) -> dict:
+        """Return call, retry, failure and token counts and latency percentiles"""
+        with self._lock:
+            latencies = sorted(self.latencies)
+            stats = {
+                "calls": self.calls,
+                "retries": self.retries,
+                "failures": self.failures,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+            }
+        if latencies:
+            stats["p50"] = round(latencies[len(latencies) // 2], 3)
+            stats["max"] = round(latencies[-1], 3)
+        return stats
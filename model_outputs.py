@@ -0,0 +1,109 @@
+import json
+import re
+from json.decoder import scanstring
+from typing import List, NamedTuple, Optional
+
+# JSON schemas the model's answers are constrained to. Strict mode needs
+# every property listed as required and no additional properties.
+COMMENT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "comment": {"type": "string"},
+    },
+    "required": ["comment"],
+    "additionalProperties": False,
+}
+
+# Replies come first so they can be handed out while the summary is still streaming
+CHAT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "replies": {"type": "array", "items": {"type": "string"}},
+        "summary": {"type": "string"},
+    },
+    "required": ["replies", "summary"],
+    "additionalProperties": False,
+}
+
+REPLIES_START_PATTERN = re.compile(r'"replies"\s*:\s*\[')
+
+
+class ChatReplies(NamedTuple):
+    """Suggested replies to a chat and the model's summary of it"""
+    replies: List[str]
+    summary: Optional[str]
+
+
+def response_format(name: str, schema: dict) -> dict:
+    """The `response_format` argument constraining a completion to `schema`"""
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+def validate(value, schema: dict, path: str = "$"):
+    """Raise ValueError unless `value` matches the subset of JSON schema used above"""
+    expected = schema["type"]
+    if expected == "object":
+        if not isinstance(value, dict):
+            raise ValueError(f"{path}: expected an object")
+        missing = [key for key in schema["required"] if key not in value]
+        if missing:
+            raise ValueError(f"{path}: missing {', '.join(missing)}")
+        for key, item in value.items():
+            if key not in schema["properties"]:
+                raise ValueError(f"{path}: unexpected property {key}")
+            validate(item, schema["properties"][key], f"{path}.{key}")
+    elif expected == "array":
+        if not isinstance(value, list):
+            raise ValueError(f"{path}: expected an array")
+        for index, item in enumerate(value):
+            validate(item, schema["items"], f"{path}[{index}]")
+    elif expected == "string":
+        if not isinstance(value, str):
+            raise ValueError(f"{path}: expected a string")
+
+
+def _load(content: Optional[str], schema: dict) -> dict:
+    if content is None:
+        raise ValueError("Model returned no content")
+    try:
+        value = json.loads(content)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Model output is not valid JSON ({e}): {content[:200]!r}") from None
+    validate(value, schema)
+    return value
+
+
+def parse_comment(content: Optional[str]) -> str:
+    """Return the comment from a COMMENT_SCHEMA answer"""
+    return _load(content, COMMENT_SCHEMA)["comment"].strip()
+
+
+def parse_chat_replies(content: Optional[str], max_replies: int = 5) -> ChatReplies:
+    """Return the non-empty replies and the summary from a CHAT_SCHEMA answer"""
+    value = _load(content, CHAT_SCHEMA)
+    replies = [reply.strip() for reply in value["replies"] if reply.strip()]
+    return ChatReplies(replies[:max_replies], value["summary"].strip() or None)
+
+
+def completed_replies(partial: str) -> List[str]:
+    """Return the replies whose strings are complete in a partially streamed CHAT_SCHEMA answer"""
+    match = REPLIES_START_PATTERN.search(partial)
+    if not match:
+        return []
+
+    replies = []
+    index = match.end()
+    while index < len(partial):
+        char = partial[index]
+        if char in " \t\r\n,":
+            index += 1
+        elif char == '"':
+            try:
+                reply, index = scanstring(partial, index + 1)
+            except ValueError:
+                # Still streaming
+                break
+            replies.append(reply)
+        else:
+            break
+    return replies
@@ -0,0 +1,75 @@
+from typing import List, NamedTuple, Optional, Tuple
+import cv2
+import numpy as np
+from frame import Frame, as_frame
+
+
+class ProfileCapture(NamedTuple):
+    """Frames of a scrolled profile stitched into one tall image.
+
+    `image` holds the `crop` region of the first frame followed by the new
+    rows of every later frame. `offsets[k]` is how far, in frame pixels,
+    the content moved up between frame k and frame k + 1, so frame k
+    starts at row `sum(offsets[:k])` of `image`.
+    """
+    image: Frame
+    frames: List[Frame]
+    offsets: List[int]
+    crop: Tuple[float, float, float, float]
+
+    @property
+    def scrolled(self) -> int:
+        """Total distance scrolled from the first frame to the last"""
+        return sum(self.offsets)
+
+
+def _region(frame: Frame, crop) -> np.ndarray:
+    left, top, right, bottom = crop
+    return frame.pixels[int(top * frame.height):int(bottom * frame.height), int(left * frame.width):int(right * frame.width)]
+
+
+def row_signatures(frame, crop, columns: int = 32) -> np.ndarray:
+    """One `columns` wide grayscale signature per pixel row of the crop region"""
+    frame = as_frame(frame)
+    left, top, right, bottom = crop
+    gray = frame.gray[int(top * frame.height):int(bottom * frame.height), int(left * frame.width):int(right * frame.width)]
+    return frame.memo(("row_signatures", crop, columns),
+                      lambda: cv2.resize(gray, (columns, gray.shape[0]), interpolation=cv2.INTER_AREA).astype(np.float32))
+
+
+def find_overlap(previous: np.ndarray, current: np.ndarray, min_overlap: float = 0.2,
+                 tolerance: float = 8.0) -> Optional[int]:
+    """Return how many rows the content moved up from `previous` to `current`.
+
+    Every row of one frame is compared with every row of the other in a
+    single matrix product; averaging the squared distances along each
+    diagonal scores all shifts at once. Returns 0 when nothing moved and
+    None when no shift leaving `min_overlap` of the rows overlapping brings
+    the RMS row difference under `tolerance`.
+    """
+    if previous.shape != current.shape:
+        return None
+    height, columns = current.shape
+
+    # distances[i, j] = |previous[i] - current[j]|^2; content moved up by s maps current[j] to previous[j + s]
+    distances = (previous * previous).sum(axis=1)[:, None] + (current * current).sum(axis=1)[None, :] \
+        - 2.0 * previous @ current.T
+    diagonals = np.subtract.outer(np.arange(height), np.arange(height)) + height - 1
+    sums = np.bincount(diagonals.ravel(), weights=distances.ravel(), minlength=2 * height - 1)
+    max_shift = int(height * (1 - min_overlap))
+    shifts = np.arange(max_shift + 1)
+    scores = sums[height - 1 + shifts] / ((height - shifts) * columns)
+
+    shift = int(np.argmin(scores))
+    if np.sqrt(max(scores[shift], 0.0)) > tolerance:
+        return None
+    return shift
+
+
+def stitch(frames: List[Frame], offsets: List[int], crop) -> Frame:
+    """Join the crop regions of consecutive frames, keeping only the new rows of each"""
+    parts = [_region(frames[0], crop)]
+    for frame, offset in zip(frames[1:], offsets):
+        if offset:
+            parts.append(_region(frame, crop)[-offset:])
+    return Frame(np.ascontiguousarray(np.concatenate(parts)))
@@ -0,0 +1,331 @@
+"""Record a live session to disk and replay it without a device or API key.
+
+Record with `python main.py swipe --record DIR`. Replay a recording through
+the real automation code and report per-profile latency with:
+
+    python replay.py DIR --profiles 50 --model-latency 1.5
+
+Run recordings with the frame stream off: replay serves frames in the order
+they were captured, so background captures would shift the sequence.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from io import BytesIO
+from types import SimpleNamespace
+from typing import Optional
+import numpy as np
+from PIL import Image
+from android_connector import AndroidDeviceConnector
+from hinge_automator import HingeAutomator
+from response_cache import ResponseCache
+from timing import timings
+
+
+class SessionRecorder:
+    """Writes captured frames, shell commands and model responses to a directory.
+
+    Frames go to `frames/NNNNNN.png`, everything else to `events.jsonl` with
+    the wall time each call took.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, "frames"), exist_ok=True)
+        self._events = open(os.path.join(directory, "events.jsonl"), "a", encoding="utf-8")
+        self._frame_count = 0
+        self._lock = threading.Lock()
+
+    def frame(self, frame: np.ndarray, duration: float):
+        with self._lock:
+            self._frame_count += 1
+            name = f"frames/{self._frame_count:06d}.png"
+            Image.fromarray(frame).save(os.path.join(self.directory, name), compress_level=1)
+            self._write({"type": "frame", "file": name, "duration": duration})
+
+    def shell(self, command: str, output: Optional[str], status: Optional[int], duration: float):
+        with self._lock:
+            self._write({"type": "shell", "command": command, "output": output, "status": status, "duration": duration})
+
+    def model(self, content: str, duration: float, usage: Optional[dict] = None):
+        with self._lock:
+            self._write({"type": "model", "content": content, "duration": duration, "usage": usage})
+
+    def close(self):
+        with self._lock:
+            self._events.close()
+
+    def _write(self, event):
+        self._events.write(json.dumps(event) + "\n")
+        self._events.flush()
+
+
+class ReplaySession:
+    """Serves a recorded session back in order.
+
+    Simulated latency is the recorded duration times `latency_scale`, unless
+    a fixed `device_latency` or `model_latency` in seconds is given. When a
+    stream of events runs out, its last entry is repeated.
+    """
+
+    def __init__(self, directory: str, device_latency: Optional[float] = None,
+                 model_latency: Optional[float] = None, latency_scale: float = 1.0):
+        self.directory = directory
+        self.device_latency = device_latency
+        self.model_latency = model_latency
+        self.latency_scale = latency_scale
+        self.frames = deque()
+        self.shell_events = defaultdict(deque)
+        self.model_events = deque()
+        self._last_frame = None
+        self._last_shell = {}
+        self._last_model = None
+        self._frame_cache = {}
+
+        with open(os.path.join(directory, "events.jsonl"), encoding="utf-8") as events:
+            for line in events:
+                event = json.loads(line)
+                if event["type"] == "frame":
+                    self.frames.append(event)
+                elif event["type"] == "shell":
+                    self.shell_events[event["command"]].append(event)
+                elif event["type"] == "model":
+                    self.model_events.append(event)
+
+    def next_frame(self) -> Optional[np.ndarray]:
+        event = self.frames.popleft() if self.frames else self._last_frame
+        if event is None:
+            return None
+        self._last_frame = event
+        self._sleep(event["duration"], self.device_latency)
+
+        frame = self._frame_cache.get(event["file"])
+        if frame is None:
+            with Image.open(os.path.join(self.directory, event["file"])) as image:
+                frame = np.asarray(image)
+            self._frame_cache = {event["file"]: frame}
+        return frame
+
+    def shell(self, command: str):
+        queue = self.shell_events.get(command)
+        event = queue.popleft() if queue else self._last_shell.get(command)
+        if event is None:
+            self._sleep(0.0, self.device_latency)
+            return "", 0
+        self._last_shell[command] = event
+        self._sleep(event["duration"], self.device_latency)
+        return event["output"], event["status"] if event["status"] is not None else 0
+
+    def next_model_event(self):
+        event = self.model_events.popleft() if self.model_events else self._last_model
+        if event is None:
+            raise RuntimeError("Recording has no model responses")
+        self._last_model = event
+        return event
+
+    def model_delay(self, event) -> float:
+        if self.model_latency is not None:
+            return self.model_latency
+        return event["duration"] * self.latency_scale
+
+    def _sleep(self, recorded: float, fixed: Optional[float]):
+        delay = fixed if fixed is not None else recorded * self.latency_scale
+        if delay > 0:
+            time.sleep(delay)
+
+
+class RecordingOpenAI:
+    """Wraps an OpenAI client and records every chat completion it returns"""
+
+    def __init__(self, client, recorder: SessionRecorder):
+        self.api_key = client.api_key
+        self._client = client
+        self._recorder = recorder
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        started = time.monotonic()
+        response = self._client.chat.completions.create(**kwargs)
+        if kwargs.get("stream"):
+            return self._record_stream(response, started)
+
+        usage = response.usage.model_dump() if getattr(response, "usage", None) else None
+        self._recorder.model(response.choices[0].message.content, time.monotonic() - started, usage)
+        return response
+
+    def _record_stream(self, stream, started):
+        parts = []
+        for chunk in stream:
+            if chunk.choices:
+                parts.append(chunk.choices[0].delta.content or "")
+            yield chunk
+        self._recorder.model("".join(parts), time.monotonic() - started)
+
+
+class ReplayOpenAI:
+    """Stands in for the OpenAI client, answering from a ReplaySession"""
+
+    def __init__(self, session: ReplaySession):
+        self.api_key = "replay"
+        self.session = session
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        event = self.session.next_model_event()
+        delay = self.session.model_delay(event)
+        if kwargs.get("stream"):
+            return self._stream(event["content"], delay)
+
+        time.sleep(delay)
+        usage = SimpleNamespace(**event["usage"]) if event.get("usage") else None
+        message = SimpleNamespace(role="assistant", content=event["content"], refusal=None)
+        return SimpleNamespace(choices=[SimpleNamespace(index=0, message=message, finish_reason="stop")], usage=usage)
+
+    def _stream(self, content, delay):
+        lines = content.splitlines(keepends=True) or [""]
+        for line in lines:
+            time.sleep(delay / len(lines))
+            delta = SimpleNamespace(role="assistant", content=line)
+            yield SimpleNamespace(choices=[SimpleNamespace(index=0, delta=delta, finish_reason=None)], usage=None)
+
+
+class RecordingMixin:
+    """Records the device and model traffic of a connector class.
+
+    Mix in ahead of the connector, e.g. `RecordingHingeAutomator` below, and
+    call `start_recording` once the model client exists.
+    """
+
+    recorder = None
+    _recording_command = False
+
+    def start_recording(self, directory: str):
+        self.recorder = SessionRecorder(directory)
+        if getattr(self, "openai_client", None) is not None:
+            self.openai_client = RecordingOpenAI(self.openai_client, self.recorder)
+
+    def capture_one_shot(self):
+        started = time.monotonic()
+        frame = super().capture_one_shot()
+        if frame is not None and self.recorder:
+            self.recorder.frame(frame, time.monotonic() - started)
+        return frame
+
+    def execute_command(self, command):
+        started = time.monotonic()
+        self._recording_command = True
+        try:
+            output = super().execute_command(command)
+        finally:
+            self._recording_command = False
+        if self.recorder:
+            self.recorder.shell(command, output, None, time.monotonic() - started)
+        return output
+
+    def execute_batch(self, commands):
+        started = time.monotonic()
+        results = super().execute_batch(commands)
+        if results is not None and self.recorder and not self._recording_command:
+            duration = (time.monotonic() - started) / len(commands)
+            for command, (output, status) in zip(commands, results):
+                self.recorder.shell(command, output, status, duration)
+        return results
+
+
+class ReplayMixin:
+    """Serves device calls of a connector class from a ReplaySession"""
+
+    replay = None
+
+    def start_replay(self, session: ReplaySession):
+        self.replay = session
+        if hasattr(self, "openai_client"):
+            self.openai_client = ReplayOpenAI(session)
+
+    def list_devices(self):
+        return ["replay"]
+
+    def connect_device(self, device_serial=None):
+        self.connected = True
+        print(f"Connected to replay of {self.replay.directory}")
+        return True
+
+    def capture_one_shot(self):
+        return self.replay.next_frame()
+
+    def take_screenshot(self):
+        frame = self.replay.next_frame()
+        if frame is None:
+            return None
+        buffer = BytesIO()
+        Image.fromarray(frame).save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    def execute_command(self, command):
+        return self.replay.shell(command)[0]
+
+    def execute_batch(self, commands):
+        return [self.replay.shell(command) for command in commands]
+
+
+class RecordingHingeAutomator(RecordingMixin, HingeAutomator):
+    pass
+
+
+class ReplayConnector(ReplayMixin, AndroidDeviceConnector):
+    pass
+
+
+class ReplayHingeAutomator(ReplayMixin, HingeAutomator):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Replayed frames must not mix into, or prune, the live archive
+        self.archiver.enabled = False
+
+
+def run_benchmark(directory, profiles, device_latency=None, model_latency=None, latency_scale=1.0, pipelined=False):
+    """Run like_and_comment over a recording and return per-profile latencies"""
+    session = ReplaySession(directory, device_latency, model_latency, latency_scale)
+    automator = ReplayHingeAutomator(openai_api_key="replay")
+    automator.pipelined = pipelined
+    automator.response_cache = ResponseCache(path=None)
+    automator.start_replay(session)
+    automator.connect_device()
+
+    latencies = []
+    failures = 0
+    for _ in range(profiles):
+        started = time.perf_counter()
+        if not automator.like_and_comment():
+            failures += 1
+        latencies.append(time.perf_counter() - started)
+    return latencies, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded session and report per-profile latency")
+    parser.add_argument("directory", help="Directory written by main.py --record")
+    parser.add_argument("--profiles", type=int, default=20, help="Number of profiles to process")
+    parser.add_argument("--device-latency", type=float, help="Fixed delay per device call in seconds")
+    parser.add_argument("--model-latency", type=float, help="Fixed delay per model call in seconds")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Multiplier for recorded delays")
+    parser.add_argument("--pipeline", action="store_true", help="Request comments while profiles are liked and the comment box opened")
+    parser.add_argument("--profile", action="store_true", help="Print per-stage timings after the run")
+    args = parser.parse_args()
+    timings.enabled = args.profile
+
+    latencies, failures = run_benchmark(
+        args.directory, args.profiles, args.device_latency, args.model_latency, args.latency_scale, args.pipeline
+    )
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+    print(f"Profiles: {len(latencies)}, failed: {failures}")
+    print(f"Latency p50={p50:.3f}s p90={p90:.3f}s p99={p99:.3f}s "
+          f"mean={np.mean(latencies):.3f}s max={np.max(latencies):.3f}s")
+    if timings.enabled:
+        print(f"\nStage timings:\n{timings.summary()}")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
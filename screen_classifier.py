@@ -0,0 +1,148 @@
+"""Local screen classification, so only profiles go to the model.
+
+Screens such as out of likes, a new match or a promotion are recognised by
+their color histogram against reference screenshots in
+`data/screens/<label>/*.png`, with <label> one of out_of_likes, match or
+promo. None are shipped, as they depend on the device and app version;
+capture them from a connected device while the screen is showing:
+
+    python screen_classifier.py out_of_likes
+"""
+import argparse
+import glob
+import os
+from collections import Counter
+from typing import Optional
+import cv2
+import numpy as np
+from PIL import Image
+from frame import as_frame
+from image_prep import PROFILE_IMAGE_CONFIG, perceptual_hash
+from ui_locator import UILocator
+
+PROFILE = "profile"
+REPEAT = "repeat"
+LOADING = "loading"
+UNKNOWN = "unknown"
+# Labels of the reference screens the automation knows how to handle
+OUT_OF_LIKES = "out_of_likes"
+MATCH = "match"
+PROMO = "promo"
+
+
+class ScreenClassifier:
+    """Labels a frame without calling the model.
+
+    In order of precedence a frame is:
+    - LOADING when it is nearly uniform, e.g. a splash screen or spinner;
+    - the label of a reference screen whose color histogram it matches,
+      references being loaded from `reference_dir/<label>/*.png`;
+    - PROFILE when the heart or skip button is on screen, or REPEAT when it
+      also hashes close to the last profile that was processed;
+    - UNKNOWN otherwise.
+    """
+
+    def __init__(self, locator: Optional[UILocator] = None, reference_dir: Optional[str] = "data/screens",
+                 loading_std: float = 6.0, histogram_threshold: float = 0.95, repeat_distance: int = 8):
+        self.locator = locator or UILocator()
+        self.loading_std = loading_std
+        self.histogram_threshold = histogram_threshold
+        self.repeat_distance = repeat_distance
+        self.reference_dir = reference_dir
+        self.counts = Counter()
+        self._references = []
+        self._last_profile_hash = None
+        if reference_dir:
+            for path in sorted(glob.glob(os.path.join(reference_dir, "*", "*.png"))):
+                with Image.open(path) as image:
+                    self.add_reference(os.path.basename(os.path.dirname(path)), np.asarray(image.convert("RGB")))
+
+    @staticmethod
+    def _thumbnail(frame):
+        frame = as_frame(frame)
+        step = max(1, max(frame.size) // 160)
+        return frame.memo(("thumbnail", step), lambda: np.ascontiguousarray(frame.rgb[::step, ::step]))
+
+    @staticmethod
+    def _histogram(thumbnail):
+        hsv = cv2.cvtColor(thumbnail, cv2.COLOR_RGB2HSV)
+        histogram = cv2.calcHist([hsv], [0, 1], None, [30, 32], [0, 180, 0, 256])
+        return cv2.normalize(histogram, histogram)
+
+    def add_reference(self, label: str, frame):
+        """Register a screenshot of a known screen under `label`"""
+        self._references.append((label, self._histogram(self._thumbnail(frame))))
+
+    @property
+    def reference_labels(self):
+        return sorted({label for label, _ in self._references})
+
+    def save_reference(self, label: str, frame) -> str:
+        """Write a screenshot to `reference_dir/<label>/` and register it; returns the path"""
+        frame = as_frame(frame)
+        directory = os.path.join(self.reference_dir, label)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{len(glob.glob(os.path.join(directory, '*.png'))) + 1:03d}.png")
+        Image.fromarray(np.ascontiguousarray(frame.rgb)).save(path)
+        self.add_reference(label, frame)
+        return path
+
+    def classify(self, frame) -> str:
+        """Return the label of a frame and count it"""
+        state = self._classify(frame)
+        self.counts[state] += 1
+        return state
+
+    def mark_processed(self, frame):
+        """Remember the profile just handled so seeing it again reads as REPEAT"""
+        self._last_profile_hash = perceptual_hash(frame, PROFILE_IMAGE_CONFIG)
+
+    def quick_classify(self, frame) -> Optional[str]:
+        """Return LOADING or a reference label from the thumbnail alone, None if the frame needs matching"""
+        frame = as_frame(frame)
+        thumbnail = self._thumbnail(frame)
+        if cv2.cvtColor(thumbnail, cv2.COLOR_RGB2GRAY).std() < self.loading_std:
+            return LOADING
+
+        if self._references:
+            histogram = frame.memo("histogram", lambda: self._histogram(thumbnail))
+            scores = [(cv2.compareHist(histogram, reference, cv2.HISTCMP_CORREL), label)
+                      for label, reference in self._references]
+            score, label = max(scores)
+            if score >= self.histogram_threshold:
+                return label
+        return None
+
+    def _classify(self, frame) -> str:
+        frame = as_frame(frame)
+        label = self.quick_classify(frame)
+        if label is not None:
+            return label
+
+        positions = self.locator.locate_all(frame)
+        if positions.get("heart") is None and positions.get("skip") is None:
+            return UNKNOWN
+
+        if self._last_profile_hash is not None:
+            distance = (perceptual_hash(frame, PROFILE_IMAGE_CONFIG) ^ self._last_profile_hash).bit_count()
+            if distance <= self.repeat_distance:
+                return REPEAT
+        return PROFILE
+
+
+if __name__ == "__main__":
+    from android_connector import AndroidDeviceConnector
+
+    parser = argparse.ArgumentParser(description="Save the screen on the device as a reference screenshot")
+    parser.add_argument("label", choices=[OUT_OF_LIKES, MATCH, PROMO], help="What the screen shows")
+    parser.add_argument("--reference-dir", default="data/screens")
+    args = parser.parse_args()
+
+    connector = AndroidDeviceConnector()
+    if connector.connect_device():
+        pixels = connector.capture_frame()
+        if pixels is None:
+            print("Failed to take screenshot")
+        else:
+            classifier = ScreenClassifier(reference_dir=args.reference_dir)
+            print(f"Saved {classifier.save_reference(args.label, pixels)}")
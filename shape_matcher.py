@@ -1,32 +1,134 @@
 import cv2
 import numpy as np
+from typing import NamedTuple, Optional, Tuple
+from frame import Frame
 
-def find_shape_coordinates(template_path, screenshot):
-    # Read the template image
-    template = cv2.imread(template_path, cv2.IMREAD_GRAYSCALE)
-    
-    # Convert screenshot to grayscale if needed
-    if len(screenshot.shape) == 3:
-        screenshot = cv2.cvtColor(screenshot, cv2.COLOR_RGB2GRAY)
-    
-    # Get template dimensions
-    w, h = template.shape[::-1]
-    
-    # Apply template matching
-    result = cv2.matchTemplate(screenshot, template, cv2.TM_CCOEFF_NORMED)
-    
-    # Get the best match location
-    min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-    
-    # Calculate center point
-    top_left = max_loc
-    center = (top_left[0] + w//2, top_left[1] + h//2)
-    
-    return center
+# Templates in data/ were cropped from a 1080 pixel wide screenshot
+REFERENCE_WIDTH = 1080
+
+
+class Match(NamedTuple):
+    x: int
+    y: int
+    score: float
+
+
+def to_grayscale(screenshot):
+    """Return a single channel view of an RGB, RGBA or grayscale array or a Frame"""
+    if isinstance(screenshot, Frame):
+        return screenshot.gray
+    if len(screenshot.shape) == 2:
+        return screenshot
+    if screenshot.shape[2] == 4:
+        return cv2.cvtColor(screenshot, cv2.COLOR_RGBA2GRAY)
+    return cv2.cvtColor(screenshot, cv2.COLOR_RGB2GRAY)
+
+
+class ShapeMatcher:
+    """Template matcher that caches templates and searches coarse-to-fine.
+
+    Templates are read from disk once and kept, per frame width, at the scale
+    they appear on screen. Matching runs on a downscaled copy of the search
+    region first and is then refined at full resolution in a small window
+    around the coarse hit. Matches scoring below `threshold` are rejected.
+    """
+
+    def __init__(self, threshold: float = 0.8, pyramid_levels: int = 2,
+                 reference_width: int = REFERENCE_WIDTH, min_template_size: int = 16):
+        self.threshold = threshold
+        self.pyramid_levels = pyramid_levels
+        self.reference_width = reference_width
+        self.min_template_size = min_template_size
+        self._templates = {}
+
+    def load_template(self, template_path: str, frame_width: Optional[int] = None):
+        """Return the grayscale template, scaled for frames of `frame_width`"""
+        key = (template_path, frame_width)
+        template = self._templates.get(key)
+        if template is not None:
+            return template
+
+        template = self._templates.get((template_path, None))
+        if template is None:
+            template = cv2.imread(template_path, cv2.IMREAD_GRAYSCALE)
+            if template is None:
+                raise FileNotFoundError(f"Template not found: {template_path}")
+            self._templates[(template_path, None)] = template
+
+        if frame_width and frame_width != self.reference_width:
+            scale = frame_width / self.reference_width
+            size = (max(1, round(template.shape[1] * scale)), max(1, round(template.shape[0] * scale)))
+            template = cv2.resize(template, size, interpolation=cv2.INTER_AREA)
+            self._templates[key] = template
+        return template
+
+    def match(self, template_path: str, screenshot, region: Optional[Tuple[float, float, float, float]] = None) -> Optional[Match]:
+        """Locate a template and return its center and score, or None.
+
+        `region` limits the search to (left, top, right, bottom) given as
+        fractions of the frame size.
+        """
+        gray = to_grayscale(screenshot)
+        template = self.load_template(template_path, gray.shape[1])
+        t_h, t_w = template.shape
+
+        offset_x, offset_y = 0, 0
+        if region:
+            frame_h, frame_w = gray.shape
+            left, top, right, bottom = region
+            offset_x, offset_y = int(left * frame_w), int(top * frame_h)
+            gray = gray[offset_y:int(bottom * frame_h), offset_x:int(right * frame_w)]
+
+        if gray.shape[0] < t_h or gray.shape[1] < t_w:
+            return None
+
+        levels = self.pyramid_levels
+        while levels > 0 and min(t_h, t_w) >> levels < self.min_template_size:
+            levels -= 1
+
+        if levels:
+            factor = 1 / (1 << levels)
+            small = cv2.resize(gray, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+            small_template = cv2.resize(template, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+            result = cv2.matchTemplate(small, small_template, cv2.TM_CCOEFF_NORMED)
+            _, _, _, coarse_loc = cv2.minMaxLoc(result)
+
+            # Refine in a window of one coarse step around the coarse hit
+            margin = 1 << (levels + 1)
+            x0 = max(0, (coarse_loc[0] << levels) - margin)
+            y0 = max(0, (coarse_loc[1] << levels) - margin)
+            x1 = min(gray.shape[1], (coarse_loc[0] << levels) + t_w + margin)
+            y1 = min(gray.shape[0], (coarse_loc[1] << levels) + t_h + margin)
+            window = gray[y0:y1, x0:x1]
+        else:
+            x0, y0 = 0, 0
+            window = gray
+
+        result = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+        _, max_val, _, max_loc = cv2.minMaxLoc(result)
+        if max_val < self.threshold:
+            return None
+
+        return Match(
+            offset_x + x0 + max_loc[0] + t_w // 2,
+            offset_y + y0 + max_loc[1] + t_h // 2,
+            float(max_val),
+        )
+
+
+_default_matcher = ShapeMatcher()
+
+
+def find_shape_coordinates(template_path, screenshot, region=None):
+    """Return the (x, y) center of the template in the screenshot, or None"""
+    match = _default_matcher.match(template_path, screenshot, region)
+    if match is None:
+        return None
+    return match.x, match.y
 
 if __name__ == "__main__":
     template_path = "data/crop_right.png"
     screenshot_path = "R5CRC36A8TT/1.png"
-    
-    center = find_shape_coordinates(template_path, screenshot_path)
-    print(f"Center point: {center}") 
\ No newline at end of file
+
+    center = find_shape_coordinates(template_path, cv2.imread(screenshot_path))
+    print(f"Center point: {center}")
\ No newline at end of file
@@ -0,0 +1,77 @@
+"""Startup time of main.py per mode, from `python -X importtime`.
+
+    python startup_benchmark.py
+    python startup_benchmark.py --repeats 10 --top 15
+
+Each run starts a fresh interpreter with `main.py <mode> --startup-only`,
+which imports what the mode needs and creates the automator without
+touching a device. Reported are the best wall time, the total import time
+and the slowest top-level imports of the last run. Modules imported on
+first use, such as openai, are timed separately.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+
+MODES = ("chat", "swipe")
+# Imported on first use rather than at startup
+DEFERRED_MODULES = ("openai",)
+
+IMPORTTIME_PATTERN = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def parse_importtime(stderr: str):
+    """Return (module, cumulative microseconds, depth) for each line of `-X importtime` output"""
+    entries = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_PATTERN.match(line)
+        if match:
+            entries.append((match.group(4), int(match.group(2)), len(match.group(3)) // 2))
+    return entries
+
+
+def run(args, env):
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", *args], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} failed:\n{result.stderr[-2000:]}")
+    return elapsed, parse_importtime(result.stderr)
+
+
+def benchmark(repeats: int = 5, top: int = 10):
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "startup-benchmark")
+    directory = os.path.dirname(os.path.abspath(__file__))
+
+    for mode in MODES:
+        best = None
+        for _ in range(repeats):
+            elapsed, entries = run([os.path.join(directory, "main.py"), mode, "--startup-only"], env)
+            best = elapsed if best is None else min(best, elapsed)
+
+        top_level = sorted((entry for entry in entries if entry[2] == 0), key=lambda entry: -entry[1])
+        total = sum(cumulative for _, cumulative, _ in top_level)
+        loaded = {module for module, _, _ in entries}
+        print(f"{mode}: {best * 1000:.0f} ms wall, {total / 1000:.0f} ms importing {len(entries)} modules")
+        for module, cumulative, _ in top_level[:top]:
+            print(f"  {cumulative / 1000:8.1f} ms  {module}")
+        eager = [module for module in DEFERRED_MODULES if module in loaded]
+        if eager:
+            print(f"  imported at startup although deferred: {', '.join(eager)}")
+
+    for module in DEFERRED_MODULES:
+        _, entries = run(["-c", f"import {module}"], env)
+        cumulative = next(cumulative for name, cumulative, depth in reversed(entries) if name == module and depth == 0)
+        print(f"deferred to first use: {module} {cumulative / 1000:.0f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure main.py startup per mode")
+    parser.add_argument("--repeats", type=int, default=5, help="Runs per mode; the best wall time is reported")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest top-level imports to list")
+    args = parser.parse_args()
+    benchmark(args.repeats, args.top)
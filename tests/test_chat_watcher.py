@@ -0,0 +1,78 @@
+import threading
+import time
+import unittest
+import numpy as np
+from chat_watcher import ChatWatcher
+from image_prep import CHAT_IMAGE_CONFIG
+
+
+class FakeAutomator:
+    """Shows one chat screen and answers suggestion requests from a script of replies or exceptions"""
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.requests = 0
+        self.chat_image_config = CHAT_IMAGE_CONFIG
+        self.frame = np.full((400, 200, 4), 255, np.uint8)
+        self.frame[300:330, 10:120, :3] = 40
+        self._lock = threading.Lock()
+
+    def capture_frame(self, newer_than=None):
+        return self.frame
+
+    def stream_chat_replies(self, frame):
+        with self._lock:
+            self.requests += 1
+            answer = self.script.pop(0) if self.script else ["fallback"]
+        if isinstance(answer, Exception):
+            raise answer
+        yield from answer
+
+
+class ChatWatcherTest(unittest.TestCase):
+    def watcher(self, automator, **kwargs):
+        watcher = ChatWatcher(automator, **kwargs)
+        self.addCleanup(watcher.stop)
+        return watcher
+
+    def test_ready_suggestions_are_reused(self):
+        automator = FakeAutomator([["hello"]])
+        watcher = self.watcher(automator)
+
+        self.assertEqual(watcher.suggestions(), ["hello"])
+        self.assertEqual(watcher.suggestions(), ["hello"])
+        self.assertEqual(automator.requests, 1)
+
+    def test_failed_job_is_resubmitted(self):
+        automator = FakeAutomator([RuntimeError("rate limited"), ["hello"]])
+        watcher = self.watcher(automator)
+
+        with self.assertRaises(RuntimeError):
+            watcher.suggestions()
+        self.assertEqual(watcher.suggestions(), ["hello"])
+        self.assertEqual(automator.requests, 2)
+
+    def test_empty_result_is_resubmitted(self):
+        automator = FakeAutomator([[], ["hello"]])
+        watcher = self.watcher(automator)
+
+        self.assertEqual(watcher.suggestions(), [])
+        self.assertEqual(watcher.suggestions(), ["hello"])
+        self.assertEqual(automator.requests, 2)
+
+    def test_failed_speculation_is_asked_again(self):
+        automator = FakeAutomator([RuntimeError("rate limited"), ["hello"]])
+        watcher = self.watcher(automator, interval=0.01)
+        watcher.start()
+
+        deadline = time.monotonic() + 2.0
+        while automator.requests < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(watcher.speculated, 1)
+
+        self.assertEqual(watcher.suggestions(), ["hello"])
+        self.assertEqual(automator.requests, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
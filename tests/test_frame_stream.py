@@ -0,0 +1,89 @@
+import threading
+import time
+import unittest
+import numpy as np
+from android_connector import AndroidDeviceConnector, FrameStream
+
+
+class FakeConnector(AndroidDeviceConnector):
+    """Serves numbered frames, or None for each True in `failures`, instead of ADB captures"""
+
+    def __init__(self, failures=(), capture_time=0.01):
+        super().__init__()
+        self.connected = True
+        self.failures = list(failures)
+        self.capture_time = capture_time
+        self.captures = 0
+        self._lock = threading.Lock()
+
+    def capture_one_shot(self):
+        time.sleep(self.capture_time)
+        with self._lock:
+            self.captures += 1
+            if self.failures and self.failures.pop(0):
+                return None
+            return np.full((4, 4, 4), self.captures, np.uint8)
+
+
+class FrameStreamTest(unittest.TestCase):
+    def stream(self, connector, **kwargs):
+        stream = FrameStream(connector, **kwargs)
+        stream.start()
+        self.addCleanup(stream.stop)
+        return stream
+
+    def test_latest_waits_for_a_newer_frame(self):
+        stream = self.stream(FakeConnector(), interval=0.05)
+        first = stream.latest()
+        self.assertIsNotNone(first)
+
+        requested = time.monotonic()
+        newer = stream.latest(newer_than=requested)
+        self.assertIsNotNone(newer)
+        self.assertGreater(newer[0, 0, 0], first[0, 0, 0])
+        self.assertGreater(stream._frame_time, requested)
+
+    def test_latest_times_out(self):
+        stream = self.stream(FakeConnector(), interval=1.0)
+        stream.latest()
+        started = time.monotonic()
+        self.assertIsNone(stream.latest(newer_than=time.monotonic(), timeout=0.2))
+        self.assertLess(time.monotonic() - started, 0.5)
+
+    def test_interval_limits_capture_rate(self):
+        connector = FakeConnector()
+        self.stream(connector, interval=0.1)
+        time.sleep(0.55)
+        self.assertLessEqual(connector.captures, 7)
+
+    def test_stops_after_repeated_failures(self):
+        connector = FakeConnector(failures=[True] * 3)
+        stream = self.stream(connector, max_failures=3)
+        self.assertIsNone(stream.latest(timeout=2.0))
+        self.assertFalse(stream.running)
+        self.assertEqual(connector.captures, 3)
+
+    def test_failures_below_the_limit_are_forgiven(self):
+        stream = self.stream(FakeConnector(failures=[True, True, False, True, True]), max_failures=3, interval=0.0)
+        self.assertIsNotNone(stream.latest(timeout=2.0))
+        time.sleep(0.5)
+        self.assertTrue(stream.running)
+
+    def test_stop_wakes_readers_and_the_capture_thread(self):
+        stream = self.stream(FakeConnector(), interval=5.0)
+        stream.latest()
+        threading.Timer(0.1, stream.stop).start()
+        started = time.monotonic()
+        self.assertIsNone(stream.latest(newer_than=time.monotonic(), timeout=3.0))
+        self.assertLess(time.monotonic() - started, 1.0)
+
+    def test_capture_frame_falls_back_when_the_stream_stopped(self):
+        connector = FakeConnector(failures=[True] * 2)
+        connector.frame_stream = self.stream(connector, max_failures=2)
+        time.sleep(0.4)
+        self.assertFalse(connector.frame_stream.running)
+        self.assertIsNotNone(connector.capture_frame())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from openai import BadRequestError, OpenAI
+from model_client import ModelClient, retry_after
+
+COMPLETION = {
+    "id": "chatcmpl-test", "object": "chat.completion", "created": 0, "model": "test",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "hi"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 100, "completion_tokens": 3, "total_tokens": 103},
+}
+
+
+class ScriptedServer:
+    """Local chat completions endpoint answering with (status, headers) from a script, then 200"""
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers["Content-Length"]))
+                server.requests.append(time.monotonic())
+                status, headers = server.script.pop(0) if server.script else (200, {})
+                body = json.dumps(COMPLETION if status == 200 else {"error": {"message": "scripted", "type": "test"}}).encode()
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self._server.server_port}/v1"
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class ModelClientTest(unittest.TestCase):
+    def client(self, server, **kwargs):
+        return ModelClient(OpenAI(api_key="test", base_url=server.url, max_retries=0), base_delay=0.01, **kwargs)
+
+    def complete(self, client):
+        return client.complete(model="test", messages=[{"role": "user", "content": "hello"}])
+
+    def test_rate_limits_wait_for_retry_after(self):
+        server = ScriptedServer([(429, {"Retry-After": "1"}), (429, {"retry-after-ms": "200"})])
+        self.addCleanup(server.close)
+        client = self.client(server)
+
+        started = time.monotonic()
+        response = self.complete(client)
+        elapsed = time.monotonic() - started
+
+        self.assertEqual(response.choices[0].message.content, "hi")
+        self.assertEqual(len(server.requests), 3)
+        self.assertGreaterEqual(server.requests[1] - server.requests[0], 1.0)
+        self.assertGreaterEqual(server.requests[2] - server.requests[1], 0.2)
+        self.assertLess(elapsed, 5.0)
+        stats = client.stats()
+        self.assertEqual((stats["calls"], stats["retries"], stats["failures"]), (1, 2, 0))
+        self.assertEqual((stats["prompt_tokens"], stats["completion_tokens"]), (100, 3))
+
+    def test_gives_up_after_max_attempts(self):
+        server = ScriptedServer([(503, {})] * 5)
+        self.addCleanup(server.close)
+        client = self.client(server, max_attempts=3)
+
+        with self.assertRaises(Exception):
+            self.complete(client)
+        self.assertEqual(len(server.requests), 3)
+        stats = client.stats()
+        self.assertEqual((stats["calls"], stats["retries"], stats["failures"]), (1, 2, 1))
+
+    def test_server_error_ignores_rate_limit_reset(self):
+        # A minute until the request budget resets, sent along with a 503
+        server = ScriptedServer([(503, {"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "1m0s"})])
+        self.addCleanup(server.close)
+        client = self.client(server, deadline=5.0)
+
+        started = time.monotonic()
+        response = self.complete(client)
+
+        self.assertEqual(response.choices[0].message.content, "hi")
+        self.assertEqual(len(server.requests), 2)
+        self.assertLess(time.monotonic() - started, 2.0)
+
+    def test_bad_request_is_not_retried(self):
+        server = ScriptedServer([(400, {})])
+        self.addCleanup(server.close)
+        client = self.client(server)
+
+        with self.assertRaises(BadRequestError):
+            self.complete(client)
+        self.assertEqual(len(server.requests), 1)
+        self.assertEqual(client.stats()["failures"], 1)
+
+    def test_deadline_stops_retrying(self):
+        server = ScriptedServer([(429, {"Retry-After": "5"})])
+        self.addCleanup(server.close)
+        client = self.client(server, deadline=1.0)
+
+        started = time.monotonic()
+        with self.assertRaises(Exception):
+            self.complete(client)
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(len(server.requests), 1)
+
+
+def error_with_headers(headers, status_code=429):
+    return SimpleNamespace(status_code=status_code, response=SimpleNamespace(headers=headers))
+
+
+class RetryAfterTest(unittest.TestCase):
+    def test_headers(self):
+        self.assertEqual(retry_after(error_with_headers({"retry-after-ms": "250"})), 0.25)
+        self.assertEqual(retry_after(error_with_headers({"retry-after": "3"})), 3.0)
+        self.assertIsNone(retry_after(error_with_headers({})))
+        self.assertIsNone(retry_after(SimpleNamespace()))
+
+    def test_rate_limit_reset(self):
+        spent = {"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "1m30s",
+                 "x-ratelimit-remaining-tokens": "0", "x-ratelimit-reset-tokens": "250ms"}
+        self.assertEqual(retry_after(error_with_headers(spent)), 90.0)
+        self.assertEqual(retry_after(error_with_headers({**spent, "x-ratelimit-remaining-requests": "12"})), 0.25)
+        self.assertEqual(retry_after(error_with_headers({**spent, "retry-after": "3"})), 3.0)
+        # Budget left, or not a rate limit: the reset time says nothing about this error
+        self.assertIsNone(retry_after(error_with_headers({"x-ratelimit-remaining-requests": "12",
+                                                          "x-ratelimit-reset-requests": "1m30s"})))
+        self.assertIsNone(retry_after(error_with_headers(spent, status_code=503)))
+
+    def test_http_date(self):
+        later = time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(time.time() + 30))
+        self.assertAlmostEqual(retry_after(error_with_headers({"retry-after": later})), 30, delta=2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import socket
+import subprocess
+import unittest
+from android_connector import AndroidDeviceConnector, ShellSession
+
+
+class FakeConnection:
+    """Runs each script written to it through the local sh and hands back
+    the output a few bytes per read, like a slow ADB socket"""
+
+    def __init__(self, chunk_size=7, hang=False):
+        self.chunk_size = chunk_size
+        self.hang = hang
+        self.scripts = []
+        self._pending = b""
+
+    def send(self, service):
+        self.service = service
+
+    def write(self, data):
+        self.scripts.append(data.decode())
+        self._pending += subprocess.run(["sh"], input=data, capture_output=True).stdout
+
+    def read(self, size):
+        if self.hang:
+            raise socket.timeout("timed out")
+        size = min(size, self.chunk_size)
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+    def close(self):
+        pass
+
+
+class FakeDevice:
+    def __init__(self, connection=None):
+        self.connection = connection
+        self.shell_commands = []
+
+    def create_connection(self, timeout=None):
+        if self.connection is None:
+            raise ConnectionRefusedError("no shell")
+        return self.connection
+
+    def shell(self, command):
+        self.shell_commands.append(command)
+        return subprocess.run(["sh", "-c", command], capture_output=True, text=True).stdout
+
+
+def connector(device):
+    connector = AndroidDeviceConnector()
+    connector.device = device
+    connector.connected = True
+    return connector
+
+
+class ShellSessionTest(unittest.TestCase):
+    def test_outputs_and_exit_statuses(self):
+        session = ShellSession(FakeDevice(FakeConnection()))
+        session.open()
+        results = session.run_batch(["echo hi", "sh -c 'exit 3'", "printf 'a\\nb'", "echo err >&2"])
+        self.assertEqual(results, [("hi\n", 0), ("", 3), ("a\nb", 0), ("err\n", 0)])
+
+    def test_output_containing_a_marker_like_line(self):
+        session = ShellSession(FakeDevice(FakeConnection(chunk_size=1)))
+        session.open()
+        results = session.run_batch(["echo __hingeswiper_0__:5", "true"])
+        self.assertEqual(results, [("__hingeswiper_0__:5\n", 0), ("", 0)])
+
+    def test_batches_share_the_connection(self):
+        connection = FakeConnection()
+        session = ShellSession(FakeDevice(connection))
+        session.open()
+        self.assertEqual(session.run("echo one"), ("one\n", 0))
+        self.assertEqual(session.run("echo two"), ("two\n", 0))
+        self.assertEqual(len(connection.scripts), 2)
+
+
+class FallbackTest(unittest.TestCase):
+    def test_failure_before_write_falls_back_and_disables_session(self):
+        device = FakeDevice(connection=None)
+        adb = connector(device)
+        self.assertEqual(adb.execute_command("echo hi"), "hi\n")
+        self.assertFalse(adb.persistent_shell)
+        self.assertEqual(adb.execute_batch(["echo a", "sh -c 'exit 2'"]), [("a\n", 0), ("", 2)])
+        self.assertEqual(len(device.shell_commands), 2)
+
+    def test_failure_after_write_is_not_run_again(self):
+        connection = FakeConnection(hang=True)
+        device = FakeDevice(connection)
+        adb = connector(device)
+        self.assertIsNone(adb.execute_command("input keyevent KEYCODE_BACK"))
+        self.assertEqual(sum("KEYCODE_BACK" in script for script in connection.scripts), 1)
+        self.assertEqual(device.shell_commands, [])
+        self.assertFalse(adb.persistent_shell)
+
+        # Later commands skip the session
+        self.assertEqual(adb.execute_command("echo later"), "later\n")
+        self.assertFalse(any("later" in script for script in connection.scripts))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,174 @@
+"""Text injection for comments and chat replies.
+
+Two methods are supported:
+
+- "adb_keyboard": a broadcast to the ADBKeyBoard IME
+  (https://github.com/senzhk/ADBKeyBoard) carrying the text as base64. It
+  handles any Unicode text and types the whole message in one command.
+- "input_text": the stock `input text` command. It only handles ASCII and
+  sends one key event per character, so it is kept as the fallback.
+
+Compare the methods on a connected device with a text field focused:
+
+    python text_input.py --benchmark
+"""
+import argparse
+import base64
+import time
+from typing import Iterable, List, Optional
+
+ADB_KEYBOARD_IME = "com.android.adbkeyboard/.AdbIME"
+
+# Typographic characters models like to emit, mapped to ASCII for `input text`
+ASCII_REPLACEMENTS = str.maketrans({
+    "\u2018": "'", "\u2019": "'", "\u201c": '"', "\u201d": '"',
+    "\u2013": "-", "\u2014": "-", "\u2026": "...", "\u00a0": " ",
+})
+
+
+def quote_shell(text: str) -> str:
+    """Quote a string as a single argument for the device shell"""
+    return "'" + text.replace("'", "'\\''") + "'"
+
+
+def input_text_command(text: str) -> str:
+    """Build an `input text` command typing `text` verbatim.
+
+    `input text` turns "%s" into a space and cannot type other whitespace
+    or non-ASCII characters. Typographic quotes and dashes are mapped to
+    ASCII, other whitespace becomes a space and anything else is dropped.
+    """
+    text = text.translate(ASCII_REPLACEMENTS)
+    ascii_text = "".join(ch for ch in text if 32 <= ord(ch) < 127 or ch in "\t\n")
+    ascii_text = ascii_text.replace("\t", " ").replace("\n", " ").replace(" ", "%s")
+    return f"input text {quote_shell(ascii_text)}"
+
+
+def adb_keyboard_command(text: str) -> str:
+    """Build the ADBKeyBoard broadcast that types `text`"""
+    encoded = base64.b64encode(text.encode("utf-8")).decode("ascii")
+    return f"am broadcast -a ADB_INPUT_B64 --es msg {encoded}"
+
+
+class TextInjector:
+    """Types text into the focused field through the fastest available method.
+
+    With `method="auto"` the ADBKeyBoard broadcast is used when that IME is
+    installed, `input text` otherwise. `activate` switches the IME in once
+    per session and only uses it after the system reports it as the default
+    input method, since a broadcast nobody receives still exits 0. `restore`
+    switches the previous keyboard back.
+    """
+
+    def __init__(self, connector, method: str = "auto"):
+        self.connector = connector
+        self.method = method
+        self._adb_keyboard_installed = None
+        self._previous_ime = None
+        self._active = None
+
+    def resolve_method(self) -> str:
+        if self.method != "auto":
+            return self.method
+        if self._adb_keyboard_installed is None:
+            output = self.connector.execute_command("ime list -s") or ""
+            self._adb_keyboard_installed = ADB_KEYBOARD_IME in output
+        return "adb_keyboard" if self._adb_keyboard_installed else "input_text"
+
+    def current_ime(self) -> str:
+        return (self.connector.execute_command("settings get secure default_input_method") or "").strip()
+
+    def activate(self, timeout: float = 2.0, poll_interval: float = 0.1) -> str:
+        """Select the method for this session and return it.
+
+        ADBKeyBoard is switched in once and confirmed as the default input
+        method before it is used; if the switch does not take within
+        `timeout` seconds, `input text` is used instead.
+        """
+        if self._active is not None:
+            return self._active
+
+        method = self.resolve_method()
+        if method == "adb_keyboard":
+            self._previous_ime = self.current_ime()
+            if self._previous_ime != ADB_KEYBOARD_IME:
+                self.connector.execute_command(f"ime set {ADB_KEYBOARD_IME}")
+                deadline = time.monotonic() + timeout
+                while self.current_ime() != ADB_KEYBOARD_IME:
+                    if time.monotonic() >= deadline:
+                        print("ADBKeyBoard did not become the input method, falling back to input text")
+                        method = "input_text"
+                        break
+                    time.sleep(poll_interval)
+        self._active = method
+        return method
+
+    @property
+    def shows_keyboard(self) -> bool:
+        """Whether a soft keyboard covers the screen while typing; ADBKeyBoard has none"""
+        return self.activate() != "adb_keyboard"
+
+    def build_commands(self, text: str, method: Optional[str] = None) -> List[str]:
+        """Return the shell commands that type `text`"""
+        method = method or self.activate()
+        # Asking for ADBKeyBoard explicitly still needs the switch confirmed
+        if method == "adb_keyboard" and self.activate() != "adb_keyboard":
+            method = "input_text"
+        if method == "adb_keyboard":
+            return [adb_keyboard_command(text)]
+
+        if any(ord(ch) >= 127 for ch in text.translate(ASCII_REPLACEMENTS)):
+            print("input text cannot type non-ASCII characters, they will be dropped")
+        return [input_text_command(text)]
+
+    def inject(self, text: str, then: Iterable[str] = (), method: Optional[str] = None) -> bool:
+        """Type `text`, followed by the `then` commands, in one shell round trip"""
+        commands = self.build_commands(text, method) + list(then)
+        results = self.connector.execute_batch(commands)
+        if results is None:
+            return False
+        failed = [(command, output) for command, (output, status) in zip(commands, results) if status != 0]
+        if failed:
+            print(f"Text injection failed: {failed}")
+            return False
+        return True
+
+    def restore(self):
+        """Switch back to the keyboard that was active before ADBKeyBoard"""
+        if self._previous_ime and self._previous_ime != ADB_KEYBOARD_IME:
+            self.connector.execute_command(f"ime set {self._previous_ime}")
+        self._previous_ime = None
+        self._active = None
+
+
+def benchmark(connector, text: str, repeats: int = 3):
+    """Print per-character latency of each available method on the focused field"""
+    injector = TextInjector(connector)
+    methods = ["input_text"]
+    # Select the IME up front so the switch is not part of the timing
+    if injector.activate() == "adb_keyboard":
+        methods.insert(0, "adb_keyboard")
+
+    for method in methods:
+        timings = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            injector.inject(text, method=method)
+            timings.append(time.perf_counter() - started)
+            # Clear the field again: move to the end, then one backspace per character
+            connector.execute_command("input keyevent KEYCODE_MOVE_END " + " ".join(["KEYCODE_DEL"] * (len(text) + 1)))
+        best = min(timings)
+        print(f"{method:>13}: {best * 1000:8.1f} ms per message, {best / len(text) * 1000:6.2f} ms per character")
+    injector.restore()
+
+if __name__ == "__main__":
+    from android_connector import AndroidDeviceConnector
+
+    parser = argparse.ArgumentParser(description="Text injection tools")
+    parser.add_argument("--benchmark", action="store_true", help="Time each method on the focused text field")
+    parser.add_argument("--text", default="Would you rather fight 1 horse sized duck or 100 duck sized horses?")
+    args = parser.parse_args()
+
+    connector = AndroidDeviceConnector()
+    if args.benchmark and connector.connect_device():
+        benchmark(connector, args.text)
\ No newline at end of file
@@ -0,0 +1,151 @@
+"""Per-stage timing spans, off unless enabled.
+
+    from timing import span, timed, timings
+
+    timings.enabled = True
+    with span("model.profile"):
+        ...
+
+    @timed("post_comment")
+    def post_comment(...):
+        ...
+
+    print(timings.summary())
+"""
+import functools
+import json
+import threading
+import time
+from contextlib import nullcontext
+from typing import Dict, List
+
+# Prometheus histogram bucket upper bounds in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_NULL_SPAN = nullcontext()
+
+
+class _Span:
+    __slots__ = ("_timer", "_name", "_start")
+
+    def __init__(self, timer, name):
+        self._timer = timer
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self._timer.record(self._name, time.perf_counter() - self._start, self._start)
+        return False
+
+
+class StageTimer:
+    """Collects span durations per stage name.
+
+    While `enabled` is False, `span` hands back one shared no-op context
+    manager, so instrumented code pays a single attribute check.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._durations: Dict[str, List[float]] = {}
+        self._events = []
+        self._lock = threading.Lock()
+
+    def span(self, name: str):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def record(self, name: str, duration: float, started: float = None):
+        with self._lock:
+            self._durations.setdefault(name, []).append(duration)
+            self._events.append((name, started, duration))
+
+    def reset(self):
+        with self._lock:
+            self._durations = {}
+            self._events = []
+
+    def stats(self) -> Dict[str, dict]:
+        """Return count, total, mean, p50, p90 and max seconds per stage"""
+        stats = {}
+        with self._lock:
+            items = [(name, sorted(values)) for name, values in self._durations.items()]
+        for name, values in items:
+            count = len(values)
+            stats[name] = {
+                "count": count,
+                "total": sum(values),
+                "mean": sum(values) / count,
+                "p50": values[int(0.5 * (count - 1))],
+                "p90": values[int(0.9 * (count - 1))],
+                "max": values[-1],
+            }
+        return stats
+
+    def summary(self) -> str:
+        """Format stats as a table sorted by total time"""
+        stats = self.stats()
+        if not stats:
+            return "No timings recorded"
+        width = max(len(name) for name in stats)
+        lines = [f"{'stage':<{width}}  {'count':>6}  {'total s':>9}  {'mean ms':>9}  {'p50 ms':>9}  {'p90 ms':>9}  {'max ms':>9}"]
+        for name, s in sorted(stats.items(), key=lambda item: -item[1]["total"]):
+            lines.append(
+                f"{name:<{width}}  {s['count']:>6}  {s['total']:>9.2f}  {s['mean'] * 1000:>9.1f}  "
+                f"{s['p50'] * 1000:>9.1f}  {s['p90'] * 1000:>9.1f}  {s['max'] * 1000:>9.1f}"
+            )
+        return "\n".join(lines)
+
+    def export_jsonl(self, path: str):
+        """Write one JSON object per recorded span"""
+        with self._lock:
+            events = list(self._events)
+        with open(path, "w", encoding="utf-8") as f:
+            for name, started, duration in events:
+                f.write(json.dumps({"stage": name, "start": started, "duration": duration}) + "\n")
+
+    def export_prometheus(self, path: str):
+        """Write stage histograms in the Prometheus text exposition format"""
+        with self._lock:
+            durations = {name: list(values) for name, values in self._durations.items()}
+        lines = [
+            "# HELP hingeswiper_stage_duration_seconds Time spent per automation stage",
+            "# TYPE hingeswiper_stage_duration_seconds histogram",
+        ]
+        for name, values in sorted(durations.items()):
+            for bound in BUCKETS:
+                count = sum(1 for value in values if value <= bound)
+                lines.append(f'hingeswiper_stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {count}')
+            lines.append(f'hingeswiper_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {len(values)}')
+            lines.append(f'hingeswiper_stage_duration_seconds_sum{{stage="{name}"}} {sum(values)}')
+            lines.append(f'hingeswiper_stage_duration_seconds_count{{stage="{name}"}} {len(values)}')
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def export(self, path: str):
+        """Export to Prometheus text for a .prom path, JSONL otherwise"""
+        if path.endswith(".prom"):
+            self.export_prometheus(path)
+        else:
+            self.export_jsonl(path)
+
+
+timings = StageTimer()
+span = timings.span
+
+
+def timed(name: str):
+    """Decorator that records each call of the wrapped function as a span"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not timings.enabled:
+                return func(*args, **kwargs)
+            with _Span(timings, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
\ No newline at end of file
@@ -0,0 +1,87 @@
+from typing import Dict, NamedTuple, Optional, Tuple
+from frame import as_frame
+from shape_matcher import ShapeMatcher
+
+
+class Anchor(NamedTuple):
+    """A named UI element, found by template or at a fixed relative position.
+
+    `position` is an (x, y) pair of fractions of the frame size. `region`
+    limits the template search, see `ShapeMatcher.match`.
+    """
+    name: str
+    template_path: Optional[str] = None
+    region: Optional[Tuple[float, float, float, float]] = None
+    position: Optional[Tuple[float, float]] = None
+
+
+# Fixed positions were measured on a 1080x2400 screen
+DEFAULT_ANCHORS = (
+    # The heart sits at the right edge of each photo and prompt card
+    Anchor("heart", template_path="data/crop_right.png", region=(0.5, 0.0, 1.0, 1.0)),
+    Anchor("skip", template_path="data/crop_left.png", region=(0.0, 0.5, 0.5, 1.0)),
+    Anchor("comment_box", position=(540 / 1080, 1500 / 2400)),
+    Anchor("keyboard_dismiss", position=(870 / 1080, 2300 / 2400)),
+    Anchor("send_button", position=(540 / 1080, 1700 / 2400)),
+    # Approximate positions in an open chat. A soft keyboard pushes the
+    # input bar and its send button up; without one they stay at the bottom.
+    Anchor("chat_input", position=(480 / 1080, 2250 / 2400)),
+    Anchor("chat_send", position=(1000 / 1080, 1420 / 2400)),
+    Anchor("chat_send_docked", position=(1000 / 1080, 2250 / 2400)),
+)
+
+
+class UILocator:
+    """Resolves all registered anchors in one pass over a frame.
+
+    The grayscale conversion is shared by every template anchor and the
+    result is memoized until a frame with a different signature arrives.
+    """
+
+    def __init__(self, matcher: Optional[ShapeMatcher] = None, anchors=DEFAULT_ANCHORS):
+        self.matcher = matcher or ShapeMatcher()
+        self.anchors = {anchor.name: anchor for anchor in anchors}
+        self._signature = None
+        self._positions = {}
+
+    def register(self, anchor: Anchor):
+        """Add or replace an anchor and drop memoized positions"""
+        self.anchors[anchor.name] = anchor
+        self.invalidate()
+
+    def invalidate(self):
+        """Forget the memoized frame so the next lookup re-resolves anchors"""
+        self._signature = None
+        self._positions = {}
+
+    def position_at(self, name: str, width: int, height: int) -> Optional[Tuple[int, int]]:
+        """Resolve a fixed-position anchor for a frame size without a frame"""
+        anchor = self.anchors[name]
+        if anchor.position is None:
+            return None
+        return int(anchor.position[0] * width), int(anchor.position[1] * height)
+
+    def locate_all(self, frame) -> Dict[str, Optional[Tuple[int, int]]]:
+        """Return frame coordinates of every anchor, None for those not found"""
+        frame = as_frame(frame)
+        signature = frame.signature
+        if signature == self._signature:
+            return self._positions
+
+        gray = frame.gray
+        height, width = gray.shape
+        positions = {}
+        for name, anchor in self.anchors.items():
+            if anchor.template_path:
+                match = self.matcher.match(anchor.template_path, gray, anchor.region)
+                positions[name] = (match.x, match.y) if match else None
+            else:
+                positions[name] = self.position_at(name, width, height)
+
+        self._signature = signature
+        self._positions = positions
+        return positions
+
+    def locate(self, name: str, frame) -> Optional[Tuple[int, int]]:
+        """Return frame coordinates of a single anchor, or None"""
+        return self.locate_all(frame).get(name)
\ No newline at end of file